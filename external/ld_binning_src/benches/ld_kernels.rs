@@ -0,0 +1,60 @@
+// Time the f64 and bit-packed LD kernels on random SNPs and check they agree.
+// Run with `cargo bench --bench ld_kernels`.
+use ld_binning::genotypes::{PackedGenotypes, linkage_disequilibrium, standardize};
+use rand::prelude::*;
+use rand_chacha::ChaCha8Rng;
+use std::hint::black_box;
+use std::time::Instant;
+
+const N_SNPS: usize = 500;
+
+fn main() {
+    let mut rng = ChaCha8Rng::seed_from_u64(1234);
+    println!("samples\tkernel\tns_per_pair\tmax_abs_difference");
+    for n_samples in [20, 200, 2000] {
+        let mut standardized = Vec::with_capacity(N_SNPS);
+        let mut packed = Vec::with_capacity(N_SNPS);
+        while standardized.len() < N_SNPS {
+            let p: f64 = rng.random_range(0.25..0.75);
+            let dosages: Vec<f64> = (0..n_samples)
+                .map(|_| (rng.random_bool(p) as u8 + rng.random_bool(p) as u8) as f64)
+                .collect();
+            let allele_freq = dosages.iter().sum::<f64>() / (2 * n_samples) as f64;
+            if allele_freq == 0.0 || allele_freq == 1.0 {
+                continue;
+            }
+            let mut genotypes = PackedGenotypes::new(n_samples);
+            genotypes.pack(&dosages, allele_freq).unwrap();
+            packed.push(genotypes);
+            let mut genotypes = dosages;
+            standardize(&mut genotypes, allele_freq);
+            standardized.push(genotypes);
+        }
+        let n_pairs = (N_SNPS * N_SNPS) as f64;
+
+        let start = Instant::now();
+        let mut reference = Vec::with_capacity(N_SNPS * N_SNPS);
+        for a in standardized.iter() {
+            for b in standardized.iter() {
+                reference.push(black_box(linkage_disequilibrium(a, b, n_samples)));
+            }
+        }
+        let elapsed = start.elapsed().as_nanos() as f64 / n_pairs;
+        println!("{n_samples}\tf64\t{elapsed:.1}\t0");
+
+        let start = Instant::now();
+        let mut values = Vec::with_capacity(N_SNPS * N_SNPS);
+        for a in packed.iter() {
+            for b in packed.iter() {
+                values.push(black_box(a.linkage_disequilibrium(b)));
+            }
+        }
+        let elapsed = start.elapsed().as_nanos() as f64 / n_pairs;
+        let max_difference = reference
+            .iter()
+            .zip(&values)
+            .map(|(a, b)| (a - b).abs())
+            .fold(0.0, f64::max);
+        println!("{n_samples}\tbitpacked\t{elapsed:.1}\t{max_difference:e}");
+    }
+}
@@ -0,0 +1,50 @@
+use anyhow::Result;
+use clap::{Parser, command};
+use ld_binning::summary::{Bins, ContigState, read_states, write_states};
+
+/// Merge the --state files of ld_binning runs (e.g. several seeds of the same
+/// contigs, or parts of a contig analyzed on different nodes) with Chan's
+/// parallel update, and print the combined table of every contig
+#[derive(Parser)]
+#[command(version, about, long_about = None)]
+struct Cli {
+    /// State files written by ld_binning --state
+    #[arg(required = true)]
+    infiles: Vec<String>,
+
+    /// Recombination rate used by the runs
+    #[arg(long, default_value_t = 1.0e-8)]
+    recombination_rate: f64,
+
+    /// Also write the merged state, e.g. to merge it again later
+    #[arg(long)]
+    state: Option<String>,
+}
+
+fn main() -> Result<()> {
+    let args = Cli::parse();
+    let bins = Bins::hapne_default(args.recombination_rate);
+    // Contigs in the order they first appear across the input files
+    let mut merged: Vec<ContigState> = Vec::new();
+    for path in args.infiles.iter() {
+        for state in read_states(path, &bins)? {
+            match merged.iter_mut().find(|m| m.contig == state.contig) {
+                Some(m) => m.stats.merge(&state.stats),
+                None => merged.push(ContigState {
+                    contig: state.contig,
+                    // The merged samples do not continue any single stream
+                    seed: None,
+                    word_pos: 0,
+                    stats: state.stats,
+                }),
+            }
+        }
+    }
+    for state in merged.iter() {
+        state.stats.print_table(&bins);
+    }
+    if let Some(path) = &args.state {
+        write_states(path, &merged)?;
+    }
+    Ok(())
+}
@@ -0,0 +1,211 @@
+// C ABI of the library, loaded by src/utils/ld_binning_core.py with ctypes.
+// Arrays are contiguous and their lengths are passed alongside; functions
+// returning a status use 0 for success and -1 for invalid input, whose
+// message is then given by ld_binning_last_error.
+use crate::genotypes::{linkage_disequilibrium, standardize};
+use crate::scan::{ScanParameters, Sites, random_scan};
+use crate::summary::{Bins, SufficientSummaryStats};
+use std::cell::RefCell;
+use std::ffi::{CString, c_char};
+use std::slice;
+
+thread_local! {
+    static LAST_ERROR: RefCell<CString> = RefCell::new(CString::default());
+}
+
+fn set_last_error(message: String) {
+    let message = CString::new(message).unwrap_or_default();
+    LAST_ERROR.with(|last| *last.borrow_mut() = message);
+}
+
+/// Message of the last failed call on this thread, valid until the next one
+#[unsafe(no_mangle)]
+pub extern "C" fn ld_binning_last_error() -> *const c_char {
+    LAST_ERROR.with(|last| last.borrow().as_ptr())
+}
+
+/// Number of bins, writing their edges in Morgans to `left` and `right`
+/// unless they are null
+///
+/// # Safety
+/// `left` and `right` are null or hold the returned number of values.
+#[unsafe(no_mangle)]
+pub unsafe extern "C" fn ld_binning_bins(
+    recombination_rate: f64,
+    left: *mut f64,
+    right: *mut f64,
+) -> usize {
+    let bins = Bins::hapne_default(recombination_rate);
+    if !left.is_null() && !right.is_null() {
+        let left = unsafe { slice::from_raw_parts_mut(left, bins.nbins) };
+        let right = unsafe { slice::from_raw_parts_mut(right, bins.nbins) };
+        for i in 0..bins.nbins {
+            left[i] = bins.left_edges_in_cm[i] / 100.0;
+            right[i] = bins.right_edges_in_cm[i] / 100.0;
+        }
+    }
+    bins.nbins
+}
+
+/// Bin of each distance in bp, -1 outside of the bins
+///
+/// # Safety
+/// `distances` and `index` hold `n` values.
+#[unsafe(no_mangle)]
+pub unsafe extern "C" fn ld_binning_bin_index(
+    recombination_rate: f64,
+    distances: *const f64,
+    n: usize,
+    index: *mut i64,
+) {
+    let bins = Bins::hapne_default(recombination_rate);
+    let distances = unsafe { slice::from_raw_parts(distances, n) };
+    let index = unsafe { slice::from_raw_parts_mut(index, n) };
+    for (i, &distance) in index.iter_mut().zip(distances) {
+        *i = if distance < bins.minimum as f64 || distance > bins.maximum as f64 {
+            -1
+        } else {
+            bins.index(distance) as i64
+        };
+    }
+}
+
+/// Standardize rows of dosages in place, setting `passing` to whether each
+/// passes the MAF filter. Rows that do not pass are left unchanged. Returns 0,
+/// or -1 without touching the arrays when there are no samples.
+///
+/// # Safety
+/// `genotypes` holds `n_sites * n_samples` values and `passing` `n_sites`.
+#[unsafe(no_mangle)]
+pub unsafe extern "C" fn ld_binning_standardize(
+    genotypes: *mut f64,
+    n_sites: usize,
+    n_samples: usize,
+    maf_threshold: f64,
+    passing: *mut u8,
+) -> i32 {
+    if n_samples == 0 {
+        set_last_error("No samples to standardize".to_string());
+        return -1;
+    }
+    let genotypes = unsafe { slice::from_raw_parts_mut(genotypes, n_sites * n_samples) };
+    let passing = unsafe { slice::from_raw_parts_mut(passing, n_sites) };
+    for (row, passing) in genotypes.chunks_exact_mut(n_samples).zip(passing) {
+        let allele_freq = row.iter().sum::<f64>() / (2 * n_samples) as f64;
+        let maf = allele_freq.min(1.0 - allele_freq);
+        *passing = (maf >= maf_threshold) as u8;
+        if maf >= maf_threshold {
+            standardize(row, allele_freq);
+        }
+    }
+    0
+}
+
+/// LD statistic between the standardized `focal` genotypes and each row of
+/// `others`. Returns 0, or -1 without touching `ld` when there are fewer than
+/// two samples.
+///
+/// # Safety
+/// `focal` holds `n_samples` values, `others` `n_rows * n_samples` and `ld`
+/// `n_rows`.
+#[unsafe(no_mangle)]
+pub unsafe extern "C" fn ld_binning_linkage_disequilibrium(
+    focal: *const f64,
+    others: *const f64,
+    n_rows: usize,
+    n_samples: usize,
+    ld: *mut f64,
+) -> i32 {
+    if n_samples < 2 {
+        set_last_error(format!("LD needs at least 2 samples, got {n_samples}"));
+        return -1;
+    }
+    let focal = unsafe { slice::from_raw_parts(focal, n_samples) };
+    let others = unsafe { slice::from_raw_parts(others, n_rows * n_samples) };
+    let ld = unsafe { slice::from_raw_parts_mut(ld, n_rows) };
+    for (value, row) in ld.iter_mut().zip(others.chunks_exact(n_samples)) {
+        *value = linkage_disequilibrium(focal, row, n_samples);
+    }
+    0
+}
+
+/// Stopping rule over per-bin (N, mean, M2): sets `converged` for each bin
+/// and returns whether all of them are
+///
+/// # Safety
+/// `counts`, `mean`, `m2` and `converged` hold `nbins` values.
+#[unsafe(no_mangle)]
+pub unsafe extern "C" fn ld_binning_converged(
+    counts: *const u32,
+    mean: *const f64,
+    m2: *const f64,
+    nbins: usize,
+    min_loci: usize,
+    epsilon: f64,
+    converged: *mut u8,
+) -> bool {
+    let stats = unsafe {
+        SufficientSummaryStats {
+            counts: slice::from_raw_parts(counts, nbins).to_vec(),
+            ld: slice::from_raw_parts(mean, nbins).to_vec(),
+            ld_square: slice::from_raw_parts(m2, nbins).to_vec(),
+        }
+    };
+    let converged = unsafe { slice::from_raw_parts_mut(converged, nbins) };
+    for (i, done) in converged.iter_mut().enumerate() {
+        *done = stats.converged(i, min_loci, epsilon) as u8;
+    }
+    stats.should_stop(min_loci, epsilon)
+}
+
+/// Binned LD of in-memory sites (see `scan::random_scan`), writing the
+/// per-bin N, mean and M2. Returns 0 when the stopping rule was met, 1 when
+/// `max_draws` (0 for no limit) was reached first and -1 on invalid input.
+///
+/// # Safety
+/// `positions` holds `n_sites` values, `dosages` `n_sites * n_samples`, and
+/// `counts`, `mean` and `m2` as many as `ld_binning_bins` returns.
+#[unsafe(no_mangle)]
+pub unsafe extern "C" fn ld_binning_scan(
+    positions: *const u64,
+    dosages: *const u8,
+    n_sites: usize,
+    n_samples: usize,
+    contig_length: u64,
+    recombination_rate: f64,
+    maf_threshold: f64,
+    min_loci: usize,
+    epsilon: f64,
+    seed: u64,
+    max_draws: u64,
+    counts: *mut u32,
+    mean: *mut f64,
+    m2: *mut f64,
+) -> i32 {
+    let bins = Bins::hapne_default(recombination_rate);
+    let positions = unsafe { slice::from_raw_parts(positions, n_sites) };
+    let dosages = unsafe { slice::from_raw_parts(dosages, n_sites * n_samples) };
+    let parameters = ScanParameters {
+        contig_length,
+        maf_threshold,
+        min_loci,
+        epsilon,
+        seed,
+        max_draws: (max_draws > 0).then_some(max_draws),
+    };
+    let result = Sites::new(positions, dosages, n_samples)
+        .and_then(|sites| random_scan(&sites, &bins, &parameters));
+    let (stats, stopped) = match result {
+        Ok(result) => result,
+        Err(e) => {
+            set_last_error(format!("{e:#}"));
+            return -1;
+        }
+    };
+    unsafe {
+        slice::from_raw_parts_mut(counts, bins.nbins).copy_from_slice(&stats.counts);
+        slice::from_raw_parts_mut(mean, bins.nbins).copy_from_slice(&stats.ld);
+        slice::from_raw_parts_mut(m2, bins.nbins).copy_from_slice(&stats.ld_square);
+    }
+    if stopped { 0 } else { 1 }
+}
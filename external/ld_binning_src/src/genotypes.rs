@@ -0,0 +1,121 @@
+// Genotype representations of a SNP and the LD kernels between two SNPs
+
+// Standardize dosages in place with the alternative allele frequency
+pub fn standardize(genotypes: &mut [f64], allele_freq: f64) {
+    for val in genotypes.iter_mut() {
+        *val = (*val - 2.0 * allele_freq) / (2.0 * allele_freq * (1.0 - allele_freq)).sqrt();
+    }
+}
+
+pub fn linkage_disequilibrium(genotypes1: &[f64], genotypes2: &[f64], n_samples: usize) -> f64 {
+    assert!(
+        genotypes1.len() >= n_samples && genotypes2.len() >= n_samples,
+        "Input length mismatch"
+    );
+
+    let s = n_samples as f64;
+    let mut ld = 0.0;
+    let mut ld_square = 0.0;
+
+    for i in 0..n_samples {
+        let a = genotypes1[i];
+        let b = genotypes2[i];
+        let prod = a * b;
+        ld += prod;
+        ld_square += prod * prod;
+    }
+
+    (ld * ld - ld_square) / (s * (s - 1.0))
+}
+
+/// Biallelic dosages packed as two bitplanes, one bit per sample for
+/// heterozygotes and one for alternative homozygotes. A standardized genotype
+/// takes only three values, so the sums of products and squared products in
+/// `linkage_disequilibrium` follow from the 3x3 table of genotype classes,
+/// whose four inner cells are popcounts and the rest come from the margins.
+#[derive(Clone, Debug)]
+pub struct PackedGenotypes {
+    n_samples: usize,
+    het: Vec<u64>,
+    hom: Vec<u64>,
+    // Number of samples with dosage 0, 1 and 2
+    counts: [u32; 3],
+    // Standardized genotype of dosage 0, 1 and 2
+    values: [f64; 3],
+}
+
+impl PackedGenotypes {
+    pub fn new(n_samples: usize) -> Self {
+        let n_words = n_samples.div_ceil(64);
+        Self {
+            n_samples,
+            het: vec![0; n_words],
+            hom: vec![0; n_words],
+            counts: [0; 3],
+            values: [0.0; 3],
+        }
+    }
+
+    // Pack dosages (sums of allele indices) given the alternative allele frequency
+    pub fn pack(&mut self, dosages: &[f64], allele_freq: f64) -> Result<(), String> {
+        assert_eq!(dosages.len(), self.n_samples, "Input length mismatch");
+        self.het.fill(0);
+        self.hom.fill(0);
+        self.counts = [0; 3];
+        for (i, &dosage) in dosages.iter().enumerate() {
+            let bit = 1u64 << (i % 64);
+            match dosage as u32 {
+                0 => {}
+                1 => self.het[i / 64] |= bit,
+                2 => self.hom[i / 64] |= bit,
+                _ => return Err(format!("Dosage {dosage} needs a biallelic record")),
+            }
+            self.counts[dosage as usize] += 1;
+        }
+        // Same expression as `standardize`, so both kernels see the same values
+        for (j, value) in self.values.iter_mut().enumerate() {
+            *value =
+                (j as f64 - 2.0 * allele_freq) / (2.0 * allele_freq * (1.0 - allele_freq)).sqrt();
+        }
+        Ok(())
+    }
+
+    pub fn linkage_disequilibrium(&self, other: &Self) -> f64 {
+        assert_eq!(self.n_samples, other.n_samples, "Input length mismatch");
+        // Samples in each pair of (het, hom) classes of the two SNPs
+        let (mut het_het, mut het_hom, mut hom_het, mut hom_hom) = (0u32, 0u32, 0u32, 0u32);
+        for ((&a1, &a2), (&b1, &b2)) in self
+            .het
+            .iter()
+            .zip(&self.hom)
+            .zip(other.het.iter().zip(&other.hom))
+        {
+            het_het += (a1 & b1).count_ones();
+            het_hom += (a1 & b2).count_ones();
+            hom_het += (a2 & b1).count_ones();
+            hom_hom += (a2 & b2).count_ones();
+        }
+        let mut table = [[0u32; 3]; 3];
+        table[1][1] = het_het;
+        table[1][2] = het_hom;
+        table[2][1] = hom_het;
+        table[2][2] = hom_hom;
+        table[1][0] = self.counts[1] - het_het - het_hom;
+        table[2][0] = self.counts[2] - hom_het - hom_hom;
+        table[0][1] = other.counts[1] - het_het - hom_het;
+        table[0][2] = other.counts[2] - het_hom - hom_hom;
+        table[0][0] = self.counts[0] - table[0][1] - table[0][2];
+
+        let s = self.n_samples as f64;
+        let mut ld = 0.0;
+        let mut ld_square = 0.0;
+        for (j, row) in table.iter().enumerate() {
+            for (k, &count) in row.iter().enumerate() {
+                let prod = self.values[j] * other.values[k];
+                ld += count as f64 * prod;
+                ld_square += count as f64 * prod * prod;
+            }
+        }
+        (ld * ld - ld_square) / (s * (s - 1.0))
+    }
+}
@@ -0,0 +1,4 @@
+pub mod ffi;
+pub mod genotypes;
+pub mod scan;
+pub mod summary;
@@ -1,154 +1,145 @@
-#![feature(portable_simd)]
 use anyhow::{Context, Result, bail};
 use clap::{Parser, command};
-use indicatif::ProgressBar;
-use rand::distr::Uniform;
+use indicatif::{MultiProgress, ProgressBar};
+use ld_binning::genotypes::{PackedGenotypes, linkage_disequilibrium, standardize};
+use ld_binning::summary::{
+    Bins, BlockStats, ContigState, SufficientSummaryStats, read_states, write_blocks, write_states,
+};
+use rand::distr::{Bernoulli, Uniform};
 use rand::prelude::*;
 use rand_chacha::ChaCha8Rng;
 use rust_htslib::bcf::header::HeaderRecord;
 use rust_htslib::bcf::{IndexedReader, Read, Record, record};
+use std::collections::VecDeque;
 use std::error::Error;
+use std::fs::File;
+use std::io::{BufWriter, Write};
+use std::sync::Mutex;
+use std::sync::atomic::{AtomicUsize, Ordering};
+use std::thread;
 
-// Parse the genotypes and compute the minor allele frequency
-fn precompute_standarized_genotypes(
-    record: Record,
-    parameters: &Cli,
-    genotypes: &mut [f64],
-) -> Result<Option<()>, Box<dyn Error>> {
-    // Get the genotype field
-    let n_samples = genotypes.len();
-    let buffer = record::Buffer::new();
+// Parse the genotypes of the samples in `order` into dosages
+fn read_dosages(
+    record: &Record,
+    buffer: &mut record::Buffer,
+    order: &[usize],
+    dosages: &mut [f64],
+) -> Result<(), Box<dyn Error>> {
+    // Get the genotype field, reusing the decoding buffer between records
     let raw_genotypes = record
         .genotypes_shared_buffer(buffer)
         .context("Error getting genotypes")?;
 
-    let mut total = 0;
-    for (i, val) in genotypes.iter_mut().enumerate().take(n_samples) {
+    for (val, &i) in dosages.iter_mut().zip(order) {
         *val = 0.0;
         let sample = raw_genotypes.get(i);
         for j in 0..2 {
             if let Some(gt) = sample[j].index() {
                 *val += gt as f64;
-                total += gt;
             } else {
                 return Err("Missing genotype".into());
             }
         }
     }
-    let allele_freq = total as f64 / (2 * n_samples) as f64;
+    Ok(())
+}
+
+fn passes_maf_threshold(allele_freq: f64, parameters: &Cli) -> bool {
     let maf = if allele_freq > 0.5 {
         1.0 - allele_freq
     } else {
         allele_freq
     };
-    // If the MAF is less than the threshold, skip this record
-    if maf < parameters.maf_threshold {
-        return Ok(None);
+    maf >= parameters.maf_threshold
+}
+
+// Genotypes of a record, as stored for the LD kernel
+trait GenotypeStore {
+    fn new(num_samples: usize) -> Self;
+    // Store dosages given their alternative allele frequency
+    // Whether records with more than two alleles have to be skipped
+    const BIALLELIC_ONLY: bool = false;
+    fn load(&mut self, dosages: &[f64], allele_freq: f64) -> Result<(), Box<dyn Error>>;
+    fn linkage_disequilibrium(&self, other: &Self) -> f64;
+}
+
+impl GenotypeStore for Vec<f64> {
+    fn new(num_samples: usize) -> Self {
+        vec![0.0; num_samples]
     }
-    // Compute the standardized genotypes
-    for val in genotypes.iter_mut() {
-        *val = (*val - 2.0 * allele_freq) / (2.0 * allele_freq * (1.0 - allele_freq)).sqrt();
+    fn load(&mut self, dosages: &[f64], allele_freq: f64) -> Result<(), Box<dyn Error>> {
+        self.copy_from_slice(dosages);
+        standardize(self, allele_freq);
+        Ok(())
+    }
+    fn linkage_disequilibrium(&self, other: &Self) -> f64 {
+        linkage_disequilibrium(self, other, self.len())
     }
-    Ok(Some(()))
 }
 
-pub fn linkage_disequilibrium(genotypes1: &[f64], genotypes2: &[f64], n_samples: usize) -> f64 {
-    assert!(
-        genotypes1.len() >= n_samples && genotypes2.len() >= n_samples,
-        "Input length mismatch"
-    );
-
-    let s = n_samples as f64;
-    let mut ld = 0.0;
-    let mut ld_square = 0.0;
-
-    for i in 0..n_samples {
-        let a = genotypes1[i];
-        let b = genotypes2[i];
-        let prod = a * b;
-        ld += prod;
-        ld_square += prod * prod;
+impl GenotypeStore for PackedGenotypes {
+    // The bitplanes only hold dosages 0, 1 and 2
+    const BIALLELIC_ONLY: bool = true;
+    fn new(num_samples: usize) -> Self {
+        PackedGenotypes::new(num_samples)
+    }
+    fn load(&mut self, dosages: &[f64], allele_freq: f64) -> Result<(), Box<dyn Error>> {
+        Ok(self.pack(dosages, allele_freq)?)
+    }
+    fn linkage_disequilibrium(&self, other: &Self) -> f64 {
+        PackedGenotypes::linkage_disequilibrium(self, other)
     }
-
-    (ld * ld - ld_square) / (s * (s - 1.0))
 }
 
-struct Bins {
-    nbins: usize,
-    left_edges_in_cm: Vec<f64>,
-    right_edges_in_cm: Vec<f64>,
-    left_edges_in_bp: Vec<f64>,
-    right_edges_in_bp: Vec<f64>,
-    minimum: i64,
-    maximum: i64,
+// Samples analyzed, as header indices, and the sample sizes of the sweep.
+// Each size uses the first samples of `order`, so the subsets are nested.
+struct SampleSubsets {
+    order: Vec<usize>,
+    sizes: Vec<usize>,
 }
 
-impl Bins {
-    // From HapNe supplementary material
-    fn hapne_default(recombination_rate: f64) -> Self {
-        let nbins = 19;
-        let mut left_edges_in_cm = Vec::with_capacity(nbins);
-        let mut right_edges_in_cm = Vec::with_capacity(nbins);
-
-        for i in 0..nbins {
-            let i = i as f64;
-            left_edges_in_cm.push(0.5 + 0.5 * i);
-            right_edges_in_cm.push(1.0 + 0.5 * i);
-        }
-        // Transform to base pairs using x / 100 / recombination_rate
-        let left_edges_in_bp = left_edges_in_cm
-            .iter()
-            .map(|&x| x / 100.0 / recombination_rate)
-            .collect::<Vec<f64>>();
-        let right_edges_in_bp = right_edges_in_cm
-            .iter()
-            .map(|&x| x / 100.0 / recombination_rate)
-            .collect::<Vec<f64>>();
-        let minimum = left_edges_in_bp[0].round() as i64;
-        let maximum = right_edges_in_bp[nbins - 1].round() as i64;
-        Self {
-            nbins,
-            left_edges_in_cm,
-            right_edges_in_cm,
-            left_edges_in_bp,
-            right_edges_in_bp,
-            minimum,
-            maximum,
-        }
-    }
+// Genotypes of a record in every sample subset. The record is decoded once
+// and each subset is standardized with its own allele frequency.
+struct SubsetGenotypes<G> {
+    layers: Vec<G>,
+    // Whether the record passes the MAF filter in each subset
+    passing: Vec<bool>,
 }
 
-#[derive(Debug)]
-struct SufficientSummaryStats {
-    pub counts: Vec<u32>,
-    pub ld: Vec<f64>,
-    pub ld_square: Vec<f64>,
-}
-impl SufficientSummaryStats {
-    pub fn new(bins: &Bins) -> Self {
+impl<G: GenotypeStore> SubsetGenotypes<G> {
+    fn new(subsets: &SampleSubsets) -> Self {
         Self {
-            counts: vec![0; bins.nbins],
-            ld: vec![0.0; bins.nbins],
-            ld_square: vec![0.0; bins.nbins],
+            layers: subsets.sizes.iter().map(|&n| G::new(n)).collect(),
+            passing: vec![false; subsets.sizes.len()],
         }
     }
-    pub fn should_stop(&self, args: &Cli) -> bool {
-        // First, check that all bins have at least the minimum number of samples
-        for count in self.counts.iter() {
-            if *count < args.min_loci as u32 {
-                return false;
-            }
+
+    // Returns whether the record passes the MAF filter in any subset, false
+    // for records the store cannot hold. `dosages` is scratch space for all
+    // the samples in `subsets.order`.
+    fn parse(
+        &mut self,
+        record: &Record,
+        buffer: &mut record::Buffer,
+        subsets: &SampleSubsets,
+        parameters: &Cli,
+        dosages: &mut [f64],
+    ) -> Result<bool, Box<dyn Error>> {
+        if G::BIALLELIC_ONLY && record.allele_count() != 2 {
+            self.passing.fill(false);
+            return Ok(false);
         }
-        for i in 0..self.ld.len() {
-            // Compute sample standard deviation
-            let std = (self.ld_square[i] / (self.counts[i] - 1) as f64).sqrt();
-            // Compute the CI half-width
-            let ci_half_width = std / (self.counts[i] as f64).sqrt();
-            if ci_half_width * 1.96 > args.epsilon {
-                return false;
+        read_dosages(record, buffer, &subsets.order, dosages)?;
+        for (s, &n) in subsets.sizes.iter().enumerate() {
+            let subset = &dosages[..n];
+            let allele_freq = subset.iter().sum::<f64>() / (2 * n) as f64;
+            // If the MAF is less than the threshold, skip this record in this subset
+            self.passing[s] = passes_maf_threshold(allele_freq, parameters);
+            if self.passing[s] {
+                self.layers[s].load(subset, allele_freq)?;
             }
         }
-        true
+        Ok(self.passing.iter().any(|&passing| passing))
     }
 }
 
@@ -170,6 +161,15 @@ struct Cli {
     #[arg(long, default_value_t = 0)]
     contig_index: u32,
 
+    /// Comma-separated contig indices, or "all", to analyze in one run
+    /// instead of --contig-index. Tables are written in the order given.
+    #[arg(long)]
+    contigs: Option<String>,
+
+    /// Number of contigs analyzed in parallel
+    #[arg(long, default_value_t = 1)]
+    threads: usize,
+
     /// Minimum number of loci per bin
     #[arg(long, default_value_t = 2000)]
     min_loci: usize,
@@ -181,6 +181,71 @@ struct Cli {
     /// Random seed
     #[arg(long, default_value_t = 1234)]
     seed: u64,
+
+    /// Read the contig once, keeping a sliding window of focal SNPs, instead
+    /// of fetching a random region per focal SNP until the CI target is met
+    #[arg(long)]
+    streaming: bool,
+
+    /// Probability that a SNP passing the MAF filter is used as focal SNP in
+    /// streaming mode (1.0 uses all pairs within the bins). The scan stops at
+    /// the first focal SNP whose pairs complete the stopping rule.
+    #[arg(long, default_value_t = 0.1)]
+    focal_probability: f64,
+
+    /// Store genotypes as two bitplanes and compute LD with popcounts.
+    /// Records with more than two alleles are skipped.
+    #[arg(long)]
+    bitpacked: bool,
+
+    /// Also write the raw per-bin state (count, mean, M2) of every contig,
+    /// which merge_ld_state combines across runs
+    #[arg(long)]
+    state: Option<String>,
+
+    /// Start from the state of an earlier run instead of empty bins, e.g. to
+    /// reach a tighter --epsilon. With the same --seed the random stream
+    /// continues where that run stopped.
+    #[arg(long)]
+    resume: Option<String>,
+
+    /// Also write the per-bin statistics of every genomic block (the
+    /// --block-size window of the focal SNP) to this binary columnar file,
+    /// for block bootstrap and jackknife with src/utils/ld_blocks.py
+    #[arg(long)]
+    blocks: Option<String>,
+
+    /// Block size in bp for --blocks
+    #[arg(long, default_value_t = 5_000_000)]
+    block_size: u64,
+
+    /// Only pair focal SNPs with SNPs in bins that have not met --min-loci
+    /// and --epsilon yet, fetching just the distance range of those bins
+    #[arg(long)]
+    adaptive: bool,
+
+    /// File with the names of the samples to analyze, one per line
+    #[arg(long)]
+    samples: Option<String>,
+
+    /// Analyze a random subset of this many samples (of --samples if given)
+    #[arg(long)]
+    subsample: Option<usize>,
+
+    /// Seed of the random sample subsets, --seed by default. Fixing it while
+    /// changing --seed draws other SNP pairs of the same individuals.
+    #[arg(long)]
+    subset_seed: Option<u64>,
+
+    /// Comma-separated sample sizes analyzed in the same scan, as nested
+    /// random subsets of the samples. Needs --sweep-output.
+    #[arg(long)]
+    sample_sizes: Option<String>,
+
+    /// Output file of the tables of each sample size in --sample-sizes, with
+    /// {n} replaced by the size, e.g. "binned_ld/subsample_n{n}/s1.csv"
+    #[arg(long)]
+    sweep_output: Option<String>,
 }
 
 fn find_contig_length(records: Vec<rust_htslib::bcf::HeaderRecord>, rid: u32) -> Result<u64> {
@@ -203,38 +268,56 @@ fn find_contig_length(records: Vec<rust_htslib::bcf::HeaderRecord>, rid: u32) ->
     bail!("Contig not found")
 }
 
-fn main() -> Result<()> {
-    // Read parameters from command line
-    let args = Cli::parse();
-    let src = &args.infile;
-    let rid: u32 = args.contig_index;
-    // Open indexed VCF or BCF (better)
-    let mut file =
-        IndexedReader::from_path(src).with_context(|| format!("Error opening file {src}"))?;
-    // Get contig information
-    let header = file.header();
-    let records = header.header_records();
-    let contig_length = find_contig_length(records, rid)
-        .with_context(|| format!("Error finding contig length for the index {rid}"))?;
-    // Initialize data structures
-    let bins = Bins::hapne_default(args.recombination_rate);
-    let mut summary_stats = SufficientSummaryStats::new(&bins);
-    let num_samples = header.samples().len();
-    let mut genotypes1: Vec<f64> = vec![0.0; num_samples];
-    let mut genotypes2: Vec<f64> = vec![0.0; num_samples];
-    // Chromosome to analyze
-    let pb = ProgressBar::no_length();
+// Whether every sample size has met the stopping rule
+fn all_stop(summary_stats: &[SufficientSummaryStats], args: &Cli) -> bool {
+    summary_stats
+        .iter()
+        .all(|stats| stats.should_stop(args.min_loci, args.epsilon))
+}
+
+// Draw focal SNPs at random positions and fetch their windows until the
+// stopping rule is met for every sample size
+fn random_scan<G: GenotypeStore>(
+    file: &mut IndexedReader,
+    args: &Cli,
+    rid: u32,
+    contig_length: u64,
+    bins: &Bins,
+    subsets: &SampleSubsets,
+    mut summary_stats: Vec<SufficientSummaryStats>,
+    blocks: &mut Option<BlockStats>,
+    rng: &mut ChaCha8Rng,
+    pb: ProgressBar,
+) -> Result<Vec<SufficientSummaryStats>> {
+    let mut genotypes1 = SubsetGenotypes::<G>::new(subsets);
+    let mut genotypes2 = SubsetGenotypes::<G>::new(subsets);
+    let mut dosages: Vec<f64> = vec![0.0; subsets.order.len()];
+    let mut buffer = record::Buffer::new();
     pb.set_message("Starting iterations...");
     let between = Uniform::try_from(0..contig_length).with_context(|| {
-        format!(
-            "Error creating uniform distribution from 0 to {contig_length}"
-        )
+        format!("Error creating uniform distribution from 0 to {contig_length}")
     })?;
-    // Get an RNG:
-    let mut rng = ChaCha8Rng::seed_from_u64(args.seed);
-    loop {
+    let n_sizes = subsets.sizes.len();
+    // Converged bins of each sample size, and bins converged in all of them
+    let mut converged = vec![vec![false; bins.nbins]; n_sizes];
+    let mut filled = vec![false; bins.nbins];
+    let (mut n_focal, mut n_pairs) = (0u64, 0u64);
+    while !all_stop(&summary_stats, args) {
+        if args.adaptive {
+            for (stats, converged) in summary_stats.iter().zip(converged.iter_mut()) {
+                for (i, done) in converged.iter_mut().enumerate() {
+                    *done = stats.converged(i, args.min_loci, args.epsilon);
+                }
+            }
+            for (i, done) in filled.iter_mut().enumerate() {
+                *done = converged.iter().all(|converged| converged[i]);
+            }
+        }
+        // Bins still to be filled, all of them without --adaptive
+        let first_bin = filled.iter().position(|&done| !done).unwrap();
+        let last_bin = filled.iter().rposition(|&done| !done).unwrap();
         // First, we draw a random position in the chromosome
-        let sampled = between.sample(&mut rng);
+        let sampled = between.sample(rng);
         // Fetch the region from pos1 to pos1 + bins.maximum
         file.fetch(rid, sampled, None)
             .with_context(|| format!("Error fetching region {rid}:{sampled}:"))?;
@@ -245,19 +328,22 @@ fn main() -> Result<()> {
         }
         let record1 = record1.unwrap().context("Error while reading record")?;
         let pos1 = record1.pos() as u64;
-        match precompute_standarized_genotypes(record1, &args, &mut genotypes1) {
-            Ok(Some(())) => {}
-            Ok(None) => continue,
+        match genotypes1.parse(&record1, &mut buffer, subsets, args, &mut dosages) {
+            Ok(true) => {}
+            Ok(false) => continue,
             Err(e) => {
                 bail!("Error parsing genotypes: {}", e);
             }
         }
-        // Now, we fetch the region from pos1 + bins.minimum to pos1 + bins.maximum
-        let region = (pos1 + bins.minimum as u64, pos1 + bins.maximum as u64);
+        n_focal += 1;
+        // Now, we fetch the region from pos1 + bins.minimum to pos1 + bins.maximum,
+        // narrowed to the distances of the bins still to be filled
+        let (minimum, maximum) = bins.distance_range(first_bin, last_bin);
+        let region = (pos1 + minimum, pos1 + maximum);
         file.fetch(rid, region.0, Some(region.1))
             .with_context(|| format!("Error fetching region {}:{}:{}", rid, region.0, region.1))?;
         // Most of the time, the second record will be in the first bin
-        let mut index = 0;
+        let mut index = first_bin;
         for record2 in file.records() {
             let record2 = record2.context("Error while reading record")?;
             let pos2 = record2.pos() as u64;
@@ -272,43 +358,383 @@ fn main() -> Result<()> {
             assert!(index < bins.nbins);
             assert!(bins.left_edges_in_bp[index] <= distance);
             assert!(bins.right_edges_in_bp[index] >= distance);
+            // Sample sizes where the focal SNP passed and the bin is still open
+            let wanted = |s: usize| genotypes1.passing[s] && !converged[s][index];
+            if !(0..n_sizes).any(wanted) {
+                continue;
+            }
 
             // Parse the genotypes of the second record and skip if MAF is too low
-            match precompute_standarized_genotypes(record2, &args, &mut genotypes2) {
-                Ok(Some(())) => {}
-                Ok(None) => continue,
+            match genotypes2.parse(&record2, &mut buffer, subsets, args, &mut dosages) {
+                Ok(true) => {}
+                Ok(false) => continue,
                 Err(e) => {
                     bail!("Error parsing genotypes: {}", e);
                 }
             };
             // Compute the sufficient statistics
-            summary_stats.counts[index] += 1;
-            let new_value = linkage_disequilibrium(&genotypes1, &genotypes2, num_samples);
-            let delta = new_value - summary_stats.ld[index];
-            summary_stats.ld[index] += delta / summary_stats.counts[index] as f64;
-            let delta2 = new_value - summary_stats.ld[index];
-            summary_stats.ld_square[index] += delta * delta2;
+            for s in (0..n_sizes).filter(|&s| wanted(s) && genotypes2.passing[s]) {
+                let new_value = genotypes1.layers[s].linkage_disequilibrium(&genotypes2.layers[s]);
+                n_pairs += 1;
+                summary_stats[s].update(index, new_value);
+                // Only with a single sample size, see main
+                if let Some(blocks) = blocks {
+                    blocks.update(pos1, index, new_value);
+                }
+            }
         }
         // Increment the progress bar
         pb.inc(1);
-        if summary_stats.should_stop(&args) {
+    }
+    pb.finish_with_message("Done!");
+    eprintln!("Contig {rid}: {n_focal} focal SNPs, {n_pairs} pairwise LD evaluations");
+    Ok(summary_stats)
+}
+
+// Read the contig once. Every record is decoded and standardized a single
+// time; SNPs drawn as focal are kept while they are within bins.maximum of
+// the current record, which is paired with all of them. The stopping rule is
+// checked whenever a focal SNP has been paired with its whole window, and the
+// rest of the contig is skipped once it is met.
+fn streaming_scan<G: GenotypeStore>(
+    file: &mut IndexedReader,
+    args: &Cli,
+    rid: u32,
+    bins: &Bins,
+    subsets: &SampleSubsets,
+    mut summary_stats: Vec<SufficientSummaryStats>,
+    blocks: &mut Option<BlockStats>,
+    rng: &mut ChaCha8Rng,
+    pb: ProgressBar,
+) -> Result<Vec<SufficientSummaryStats>> {
+    let mut genotypes = SubsetGenotypes::<G>::new(subsets);
+    let mut dosages: Vec<f64> = vec![0.0; subsets.order.len()];
+    let mut buffer = record::Buffer::new();
+    // Focal SNPs within reach of the current record, oldest first
+    let mut window: VecDeque<(u64, SubsetGenotypes<G>)> = VecDeque::new();
+    // Genotypes of focal SNPs that left the window, reused
+    let mut spare: Vec<SubsetGenotypes<G>> = Vec::new();
+    let focal = Bernoulli::new(args.focal_probability)
+        .with_context(|| format!("Invalid focal probability {}", args.focal_probability))?;
+    pb.set_message("Reading records...");
+    file.fetch(rid, 0, None)
+        .with_context(|| format!("Error fetching contig {rid}"))?;
+    let mut record = file.empty_record();
+    while let Some(result) = file.read(&mut record) {
+        result.context("Error while reading record")?;
+        pb.inc(1);
+        let pos2 = record.pos() as u64;
+        match genotypes.parse(&record, &mut buffer, subsets, args, &mut dosages) {
+            Ok(true) => {}
+            Ok(false) => continue,
+            Err(e) => {
+                bail!("Error parsing genotypes: {}", e);
+            }
+        }
+        // Drop focal SNPs that are now too far away
+        let mut completed = false;
+        while let Some((pos1, _)) = window.front() {
+            if pos2 - pos1 <= bins.maximum as u64 {
+                break;
+            }
+            let (_, old) = window.pop_front().unwrap();
+            spare.push(old);
+            completed = true;
+        }
+        if completed && all_stop(&summary_stats, args) {
+            eprintln!("Contig {rid}: stopping rule met at position {pos2}");
             break;
         }
+        for (pos1, genotypes1) in window.iter() {
+            let distance = (pos2 - pos1) as f64;
+            if distance < bins.minimum as f64 {
+                // Later focal SNPs are even closer
+                break;
+            }
+            let index = bins.index(distance);
+            for (s, stats) in summary_stats.iter_mut().enumerate() {
+                if !(genotypes1.passing[s] && genotypes.passing[s]) {
+                    continue;
+                }
+                let new_value = genotypes1.layers[s].linkage_disequilibrium(&genotypes.layers[s]);
+                stats.update(index, new_value);
+                if let Some(blocks) = blocks {
+                    blocks.update(*pos1, index, new_value);
+                }
+            }
+        }
+        if focal.sample(rng) {
+            // Keep the current genotypes and parse the next record into spare ones
+            let next = spare.pop().unwrap_or_else(|| SubsetGenotypes::new(subsets));
+            window.push_back((pos2, std::mem::replace(&mut genotypes, next)));
+        }
     }
     pb.finish_with_message("Done!");
-    // Finalize the summary statistics
-    println!("#bin_index\tleft_bin\tright_bin\tN\tmean\tvar");
-    for i in 0..bins.nbins {
-        summary_stats.ld_square[i] /= summary_stats.counts[i] as f64;
-        println!(
-            "{}\t{}\t{}\t{}\t{}\t{}",
-            i,
-            bins.left_edges_in_cm[i] / 100.0,
-            bins.right_edges_in_cm[i] / 100.0,
-            summary_stats.counts[i],
-            summary_stats.ld[i],
-            summary_stats.ld_square[i]
+    if !all_stop(&summary_stats, args) {
+        eprintln!(
+            "Warning: contig {rid} read entirely without reaching --min-loci {} and --epsilon {}",
+            args.min_loci, args.epsilon
         );
     }
+    Ok(summary_stats)
+}
+
+// Independent deterministic stream per contig, so results do not depend on
+// the number of threads or on which other contigs are analyzed
+fn contig_rng(seed: u64, rid: u32) -> ChaCha8Rng {
+    let mut rng = ChaCha8Rng::seed_from_u64(seed);
+    rng.set_stream(rid as u64);
+    rng
+}
+
+// Returns the state of every sample size, in the order of `subsets.sizes`
+fn analyze_contig(
+    args: &Cli,
+    rid: u32,
+    bins: &Bins,
+    subsets: &SampleSubsets,
+    pb: ProgressBar,
+    resume: Option<&ContigState>,
+) -> Result<(Vec<ContigState>, Option<BlockStats>)> {
+    let src = &args.infile;
+    // Open indexed VCF or BCF (better), one reader per contig
+    let mut file =
+        IndexedReader::from_path(src).with_context(|| format!("Error opening file {src}"))?;
+    // Get contig information
+    let header = file.header();
+    let records = header.header_records();
+    let contig_length = find_contig_length(records, rid)
+        .with_context(|| format!("Error finding contig length for the index {rid}"))?;
+    let mut rng = contig_rng(args.seed, rid);
+    let stats = match resume {
+        Some(state) => {
+            // Skip the focal SNPs the resumed run has already drawn
+            if state.seed == Some(args.seed) {
+                rng.set_word_pos(state.word_pos);
+            }
+            vec![state.stats.clone()]
+        }
+        None => vec![SufficientSummaryStats::new(bins); subsets.sizes.len()],
+    };
+    let mut blocks = args
+        .blocks
+        .as_ref()
+        .map(|_| BlockStats::new(bins, args.block_size));
+    let (f, b, r) = (&mut file, &mut blocks, &mut rng);
+    let n = subsets;
+    let stats = match (args.streaming, args.bitpacked) {
+        (true, false) => streaming_scan::<Vec<f64>>(f, args, rid, bins, n, stats, b, r, pb),
+        (true, true) => streaming_scan::<PackedGenotypes>(f, args, rid, bins, n, stats, b, r, pb),
+        (false, false) => {
+            random_scan::<Vec<f64>>(f, args, rid, contig_length, bins, n, stats, b, r, pb)
+        }
+        (false, true) => {
+            random_scan::<PackedGenotypes>(f, args, rid, contig_length, bins, n, stats, b, r, pb)
+        }
+    }?;
+    let word_pos = rng.get_word_pos();
+    let states = stats
+        .into_iter()
+        .map(|stats| ContigState {
+            contig: rid,
+            seed: Some(args.seed),
+            word_pos,
+            stats,
+        })
+        .collect();
+    Ok((states, blocks))
+}
+
+fn select_contigs(args: &Cli) -> Result<Vec<u32>> {
+    let Some(contigs) = &args.contigs else {
+        return Ok(vec![args.contig_index]);
+    };
+    let src = &args.infile;
+    let file =
+        IndexedReader::from_path(src).with_context(|| format!("Error opening file {src}"))?;
+    let n_contigs = file.header().contig_count();
+    if contigs == "all" {
+        return Ok((0..n_contigs).collect());
+    }
+    let mut selected = Vec::new();
+    for rid in contigs.split(',') {
+        let rid = rid
+            .trim()
+            .parse::<u32>()
+            .with_context(|| format!("Invalid contig index {rid}"))?;
+        if rid >= n_contigs {
+            bail!("Contig index {rid} out of range, {src} has {n_contigs} contigs");
+        }
+        selected.push(rid);
+    }
+    Ok(selected)
+}
+
+fn select_samples(args: &Cli) -> Result<SampleSubsets> {
+    let src = &args.infile;
+    let file =
+        IndexedReader::from_path(src).with_context(|| format!("Error opening file {src}"))?;
+    let header = file.header();
+    let mut order: Vec<usize> = match &args.samples {
+        Some(path) => {
+            let names = std::fs::read_to_string(path)
+                .with_context(|| format!("Error reading sample list {path}"))?;
+            let mut order = Vec::new();
+            for name in names.lines().map(str::trim).filter(|name| !name.is_empty()) {
+                let i = header
+                    .sample_id(name.as_bytes())
+                    .with_context(|| format!("Sample {name} not found in {src}"))?;
+                order.push(i);
+            }
+            order
+        }
+        None => (0..header.sample_count() as usize).collect(),
+    };
+    let sizes = match &args.sample_sizes {
+        Some(sizes) => {
+            let mut parsed = Vec::new();
+            for n in sizes.split(',') {
+                let n = n
+                    .trim()
+                    .parse::<usize>()
+                    .with_context(|| format!("Invalid sample size {n}"))?;
+                parsed.push(n);
+            }
+            parsed
+        }
+        None => Vec::new(),
+    };
+    if args.subsample.is_some() || !sizes.is_empty() {
+        // Random order, whose prefixes are the nested subsets
+        let mut rng = ChaCha8Rng::seed_from_u64(args.subset_seed.unwrap_or(args.seed));
+        // A stream no contig uses
+        rng.set_stream(u64::MAX);
+        order.shuffle(&mut rng);
+    }
+    if let Some(k) = args.subsample {
+        if k > order.len() {
+            bail!(
+                "--subsample {k} is larger than the {} samples available",
+                order.len()
+            );
+        }
+        order.truncate(k);
+    }
+    let sizes = if sizes.is_empty() {
+        vec![order.len()]
+    } else {
+        sizes
+    };
+    for &n in &sizes {
+        if n < 2 || n > order.len() {
+            bail!(
+                "Sample size {n} out of range, between 2 and {} samples",
+                order.len()
+            );
+        }
+    }
+    Ok(SampleSubsets { order, sizes })
+}
+
+fn main() -> Result<()> {
+    // Read parameters from command line
+    let args = Cli::parse();
+    let contigs = select_contigs(&args)?;
+    if contigs.is_empty() {
+        bail!("No contigs selected in {}", args.infile);
+    }
+    let subsets = select_samples(&args)?;
+    let bins = Bins::hapne_default(args.recombination_rate);
+    if args.resume.is_some() && args.blocks.is_some() {
+        bail!("--blocks only covers the pairs of the current run, it cannot be used with --resume");
+    }
+    if args.block_size == 0 {
+        bail!("--block-size must be positive");
+    }
+    if args.adaptive && args.streaming {
+        bail!("--adaptive needs random focal sampling, a streaming scan reads the contig in order");
+    }
+    if args.resume.is_some() && args.streaming {
+        bail!("--resume needs random focal sampling, a streaming scan reads the contig in order");
+    }
+    if args.sample_sizes.is_some() {
+        match &args.sweep_output {
+            Some(template) if template.contains("{n}") => {}
+            _ => bail!("--sample-sizes needs a --sweep-output path containing {{n}}"),
+        }
+        if args.state.is_some() || args.resume.is_some() || args.blocks.is_some() {
+            bail!("--state, --resume and --blocks cover a single sample size, not --sample-sizes");
+        }
+    }
+    let resumed = match &args.resume {
+        Some(path) => read_states(path, &bins)?,
+        None => Vec::new(),
+    };
+    // Contigs are taken from a shared queue by a pool of threads
+    let next = AtomicUsize::new(0);
+    let results: Vec<Mutex<Option<Result<(Vec<ContigState>, Option<BlockStats>)>>>> =
+        contigs.iter().map(|_| Mutex::new(None)).collect();
+    let progress = MultiProgress::new();
+    thread::scope(|scope| {
+        for _ in 0..args.threads.clamp(1, contigs.len()) {
+            scope.spawn(|| {
+                loop {
+                    let i = next.fetch_add(1, Ordering::Relaxed);
+                    if i >= contigs.len() {
+                        break;
+                    }
+                    let pb = progress.add(ProgressBar::no_length());
+                    let resume = resumed.iter().find(|state| state.contig == contigs[i]);
+                    let result = analyze_contig(&args, contigs[i], &bins, &subsets, pb, resume);
+                    *results[i].lock().unwrap() = Some(result);
+                }
+            });
+        }
+    });
+    // Finalize the summary statistics, one table per contig as when they are
+    // analyzed separately and concatenated
+    let mut states: Vec<Vec<ContigState>> = subsets.sizes.iter().map(|_| Vec::new()).collect();
+    let mut blocks = Vec::with_capacity(contigs.len());
+    for (rid, result) in contigs.iter().zip(results) {
+        let (contig_states, contig_blocks) = result
+            .into_inner()
+            .unwrap()
+            .expect("Every contig is analyzed")
+            .with_context(|| format!("Error analyzing contig {rid}"))?;
+        for (size_states, state) in states.iter_mut().zip(contig_states) {
+            size_states.push(state);
+        }
+        blocks.extend(contig_blocks.map(|contig_blocks| (*rid, contig_blocks)));
+    }
+    if let Some(template) = &args.sweep_output
+        && args.sample_sizes.is_some()
+    {
+        // One file per sample size
+        for (n, size_states) in subsets.sizes.iter().zip(&states) {
+            let path = template.replace("{n}", &n.to_string());
+            let file = File::create(&path).with_context(|| format!("Error creating {path}"))?;
+            let mut out = BufWriter::new(file);
+            for state in size_states {
+                state
+                    .stats
+                    .write_table(&mut out, &bins)
+                    .with_context(|| format!("Error writing {path}"))?;
+            }
+            out.flush()
+                .with_context(|| format!("Error writing {path}"))?;
+        }
+        return Ok(());
+    }
+    let states = states.pop().expect("A single sample size");
+    for state in &states {
+        state.stats.print_table(&bins);
+    }
+    if let Some(path) = &args.state {
+        write_states(path, &states)?;
+    }
+    if let Some(path) = &args.blocks {
+        let blocks: Vec<(u32, &BlockStats)> = blocks.iter().map(|(rid, b)| (*rid, b)).collect();
+        write_blocks(path, &bins, &blocks)?;
+    }
     Ok(())
 }
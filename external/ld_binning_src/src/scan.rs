@@ -0,0 +1,140 @@
+// Binned LD of sites held in memory, with the focal SNP sampling of the
+// ld_binning CLI, for callers that have genotypes without a VCF/BCF file
+use crate::genotypes::{linkage_disequilibrium, standardize};
+use crate::summary::{Bins, SufficientSummaryStats};
+use anyhow::{Context, Result, bail};
+use rand::distr::Uniform;
+use rand::prelude::*;
+use rand_chacha::ChaCha8Rng;
+
+/// Sites of one contig: 0-based positions in increasing order and, one row of
+/// `n_samples` per site, the dosages (sums of allele indices) of every
+/// individual.
+pub struct Sites<'a> {
+    pub positions: &'a [u64],
+    pub dosages: &'a [u8],
+    pub n_samples: usize,
+}
+
+impl<'a> Sites<'a> {
+    pub fn new(positions: &'a [u64], dosages: &'a [u8], n_samples: usize) -> Result<Self> {
+        if n_samples < 2 {
+            bail!("At least two samples are needed, got {n_samples}");
+        }
+        if dosages.len() != positions.len() * n_samples {
+            bail!(
+                "{} dosages do not fill {} sites of {n_samples} samples",
+                dosages.len(),
+                positions.len()
+            );
+        }
+        if positions.windows(2).any(|pair| pair[0] > pair[1]) {
+            bail!("Positions are not sorted");
+        }
+        Ok(Self {
+            positions,
+            dosages,
+            n_samples,
+        })
+    }
+
+    pub fn len(&self) -> usize {
+        self.positions.len()
+    }
+
+    pub fn is_empty(&self) -> bool {
+        self.positions.is_empty()
+    }
+
+    fn row(&self, i: usize) -> &[u8] {
+        &self.dosages[i * self.n_samples..(i + 1) * self.n_samples]
+    }
+
+    // Alternative allele frequency of site i, if it passes the MAF filter
+    pub fn allele_freq(&self, i: usize, maf_threshold: f64) -> Option<f64> {
+        let total: u64 = self.row(i).iter().map(|&dosage| dosage as u64).sum();
+        let allele_freq = total as f64 / (2 * self.n_samples) as f64;
+        let maf = allele_freq.min(1.0 - allele_freq);
+        (maf >= maf_threshold).then_some(allele_freq)
+    }
+
+    // Standardized genotypes of site i
+    pub fn standardized(&self, i: usize, allele_freq: f64, genotypes: &mut [f64]) {
+        for (val, &dosage) in genotypes.iter_mut().zip(self.row(i)) {
+            *val = dosage as f64;
+        }
+        standardize(genotypes, allele_freq);
+    }
+}
+
+pub struct ScanParameters {
+    pub contig_length: u64,
+    pub maf_threshold: f64,
+    pub min_loci: usize,
+    pub epsilon: f64,
+    pub seed: u64,
+    /// Focal positions drawn before giving up on the stopping rule
+    pub max_draws: Option<u64>,
+}
+
+/// Draw focal sites at uniformly random positions and pair each with the
+/// passing sites in the bins ahead of it until the stopping rule is met. The
+/// draws are those of ld_binning on contig 0 with the same seed, so the same
+/// sites give the same table. Returns the statistics and whether they met
+/// the stopping rule within `max_draws`.
+pub fn random_scan(
+    sites: &Sites,
+    bins: &Bins,
+    parameters: &ScanParameters,
+) -> Result<(SufficientSummaryStats, bool)> {
+    let contig_length = parameters.contig_length;
+    let between = Uniform::try_from(0..contig_length).with_context(|| {
+        format!("Error creating uniform distribution from 0 to {contig_length}")
+    })?;
+    let mut rng = ChaCha8Rng::seed_from_u64(parameters.seed);
+    // The MAF filter of every site, computed once
+    let allele_freqs: Vec<Option<f64>> = (0..sites.len())
+        .map(|i| sites.allele_freq(i, parameters.maf_threshold))
+        .collect();
+    let mut genotypes1 = vec![0.0; sites.n_samples];
+    let mut genotypes2 = vec![0.0; sites.n_samples];
+    let mut summary_stats = SufficientSummaryStats::new(bins);
+    let mut draws = 0;
+    while !summary_stats.should_stop(parameters.min_loci, parameters.epsilon) {
+        if parameters
+            .max_draws
+            .is_some_and(|max_draws| draws >= max_draws)
+        {
+            return Ok((summary_stats, false));
+        }
+        draws += 1;
+        // First site at or after a random position in the contig
+        let sampled = between.sample(&mut rng);
+        let first = sites.positions.partition_point(|&pos| pos < sampled);
+        if first == sites.len() {
+            continue;
+        }
+        let Some(allele_freq1) = allele_freqs[first] else {
+            continue;
+        };
+        let pos1 = sites.positions[first];
+        sites.standardized(first, allele_freq1, &mut genotypes1);
+        // Sites in [pos1 + bins.minimum, pos1 + bins.maximum]
+        let lo = sites
+            .positions
+            .partition_point(|&pos| pos < pos1 + bins.minimum as u64);
+        let hi = sites
+            .positions
+            .partition_point(|&pos| pos <= pos1 + bins.maximum as u64);
+        for j in lo..hi {
+            let Some(allele_freq2) = allele_freqs[j] else {
+                continue;
+            };
+            let index = bins.index((sites.positions[j] - pos1) as f64);
+            sites.standardized(j, allele_freq2, &mut genotypes2);
+            let new_value = linkage_disequilibrium(&genotypes1, &genotypes2, sites.n_samples);
+            summary_stats.update(index, new_value);
+        }
+    }
+    Ok((summary_stats, true))
+}
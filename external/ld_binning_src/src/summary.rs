@@ -0,0 +1,315 @@
+// HapNe distance bins and the running per-bin LD statistics
+use anyhow::{Context, Result, bail};
+use std::fs::File;
+use std::io::{BufRead, BufReader, BufWriter, Write};
+
+pub struct Bins {
+    pub nbins: usize,
+    pub left_edges_in_cm: Vec<f64>,
+    pub right_edges_in_cm: Vec<f64>,
+    pub left_edges_in_bp: Vec<f64>,
+    pub right_edges_in_bp: Vec<f64>,
+    pub minimum: i64,
+    pub maximum: i64,
+}
+
+impl Bins {
+    // From HapNe supplementary material
+    pub fn hapne_default(recombination_rate: f64) -> Self {
+        let nbins = 19;
+        let mut left_edges_in_cm = Vec::with_capacity(nbins);
+        let mut right_edges_in_cm = Vec::with_capacity(nbins);
+
+        for i in 0..nbins {
+            let i = i as f64;
+            left_edges_in_cm.push(0.5 + 0.5 * i);
+            right_edges_in_cm.push(1.0 + 0.5 * i);
+        }
+        // Transform to base pairs using x / 100 / recombination_rate
+        let left_edges_in_bp = left_edges_in_cm
+            .iter()
+            .map(|&x| x / 100.0 / recombination_rate)
+            .collect::<Vec<f64>>();
+        let right_edges_in_bp = right_edges_in_cm
+            .iter()
+            .map(|&x| x / 100.0 / recombination_rate)
+            .collect::<Vec<f64>>();
+        let minimum = left_edges_in_bp[0].round() as i64;
+        let maximum = right_edges_in_bp[nbins - 1].round() as i64;
+        Self {
+            nbins,
+            left_edges_in_cm,
+            right_edges_in_cm,
+            left_edges_in_bp,
+            right_edges_in_bp,
+            minimum,
+            maximum,
+        }
+    }
+
+    // Smallest and largest integer distances falling in bins first..=last
+    pub fn distance_range(&self, first: usize, last: usize) -> (u64, u64) {
+        let minimum = if first == 0 {
+            self.minimum as u64
+        } else {
+            self.right_edges_in_bp[first - 1].floor() as u64 + 1
+        };
+        let maximum = if last == self.nbins - 1 {
+            self.maximum as u64
+        } else {
+            self.right_edges_in_bp[last].floor() as u64
+        };
+        (minimum, maximum)
+    }
+
+    // First bin whose right edge is not below the distance
+    pub fn index(&self, distance: f64) -> usize {
+        self.right_edges_in_bp
+            .partition_point(|&edge| edge < distance)
+    }
+}
+
+#[derive(Clone, Debug)]
+pub struct SufficientSummaryStats {
+    pub counts: Vec<u32>,
+    pub ld: Vec<f64>,
+    pub ld_square: Vec<f64>,
+}
+impl SufficientSummaryStats {
+    pub fn new(bins: &Bins) -> Self {
+        Self {
+            counts: vec![0; bins.nbins],
+            ld: vec![0.0; bins.nbins],
+            ld_square: vec![0.0; bins.nbins],
+        }
+    }
+    // Welford update of the running mean and M2 of a bin
+    pub fn update(&mut self, index: usize, new_value: f64) {
+        self.counts[index] += 1;
+        let delta = new_value - self.ld[index];
+        self.ld[index] += delta / self.counts[index] as f64;
+        let delta2 = new_value - self.ld[index];
+        self.ld_square[index] += delta * delta2;
+    }
+    // Chan et al. parallel update, merging the statistics of independent samples
+    pub fn merge(&mut self, other: &SufficientSummaryStats) {
+        for i in 0..self.counts.len() {
+            let (n_a, n_b) = (self.counts[i] as f64, other.counts[i] as f64);
+            if other.counts[i] == 0 {
+                continue;
+            }
+            let n = n_a + n_b;
+            let delta = other.ld[i] - self.ld[i];
+            self.ld[i] += delta * n_b / n;
+            self.ld_square[i] += other.ld_square[i] + delta * delta * n_a * n_b / n;
+            self.counts[i] += other.counts[i];
+        }
+    }
+    // Whether bin i has at least min_loci pairs and a CI half-width below epsilon
+    pub fn converged(&self, i: usize, min_loci: usize, epsilon: f64) -> bool {
+        if self.counts[i] < min_loci as u32 || self.counts[i] < 2 {
+            return false;
+        }
+        // Compute sample standard deviation
+        let std = (self.ld_square[i] / (self.counts[i] - 1) as f64).sqrt();
+        // Compute the CI half-width
+        let ci_half_width = std / (self.counts[i] as f64).sqrt();
+        ci_half_width * 1.96 <= epsilon
+    }
+    pub fn should_stop(&self, min_loci: usize, epsilon: f64) -> bool {
+        (0..self.counts.len()).all(|i| self.converged(i, min_loci, epsilon))
+    }
+    // Finalized table, with the population variance of each bin
+    pub fn print_table(&self, bins: &Bins) {
+        self.write_table(&mut std::io::stdout().lock(), bins)
+            .expect("Error writing table to stdout");
+    }
+
+    pub fn write_table(&self, out: &mut impl Write, bins: &Bins) -> std::io::Result<()> {
+        writeln!(out, "#bin_index\tleft_bin\tright_bin\tN\tmean\tvar")?;
+        for i in 0..bins.nbins {
+            writeln!(
+                out,
+                "{}\t{}\t{}\t{}\t{}\t{}",
+                i,
+                bins.left_edges_in_cm[i] / 100.0,
+                bins.right_edges_in_cm[i] / 100.0,
+                self.counts[i],
+                self.ld[i],
+                self.ld_square[i] / self.counts[i] as f64
+            )?;
+        }
+        Ok(())
+    }
+}
+
+/// Per-bin statistics of the pairs of each genomic block, a block being the
+/// `block_size` bp window holding the focal SNP. Summing (with `merge`) the
+/// blocks drawn in a bootstrap or left in a jackknife replicate gives that
+/// replicate's table without recomputing any LD.
+#[derive(Debug)]
+pub struct BlockStats {
+    pub block_size: u64,
+    pub blocks: Vec<SufficientSummaryStats>,
+    nbins: usize,
+}
+
+impl BlockStats {
+    pub fn new(bins: &Bins, block_size: u64) -> Self {
+        Self {
+            block_size,
+            blocks: Vec::new(),
+            nbins: bins.nbins,
+        }
+    }
+    pub fn update(&mut self, focal_position: u64, index: usize, new_value: f64) {
+        let block = (focal_position / self.block_size) as usize;
+        if block >= self.blocks.len() {
+            let nbins = self.nbins;
+            self.blocks
+                .resize_with(block + 1, || SufficientSummaryStats {
+                    counts: vec![0; nbins],
+                    ld: vec![0.0; nbins],
+                    ld_square: vec![0.0; nbins],
+                });
+        }
+        self.blocks[block].update(index, new_value);
+    }
+}
+
+const BLOCKS_MAGIC: &[u8; 8] = b"LDBLOCK1";
+
+/// Write the non-empty (contig, block, bin) cells of every contig as a
+/// little-endian columnar file:
+/// - magic `LDBLOCK1`, block size (u64), number of bins (u32), left and right
+///   bin edges in Morgans (f64 each), number of rows (u64)
+/// - columns contig (u32), block (u32), bin_index (u32), N (u32), mean (f64)
+///   and M2 (f64), one after the other
+///
+/// src/utils/ld_blocks.py reads it and builds resampled tables.
+pub fn write_blocks(path: &str, bins: &Bins, contigs: &[(u32, &BlockStats)]) -> Result<()> {
+    let block_size = contigs.first().map_or(0, |(_, blocks)| blocks.block_size);
+    let mut contig_column: Vec<u32> = Vec::new();
+    let mut block_column: Vec<u32> = Vec::new();
+    let mut bin_column: Vec<u32> = Vec::new();
+    let mut count_column: Vec<u32> = Vec::new();
+    let mut mean_column: Vec<f64> = Vec::new();
+    let mut m2_column: Vec<f64> = Vec::new();
+    for (contig, blocks) in contigs {
+        for (block, stats) in blocks.blocks.iter().enumerate() {
+            for i in 0..stats.counts.len() {
+                if stats.counts[i] == 0 {
+                    continue;
+                }
+                contig_column.push(*contig);
+                block_column.push(block as u32);
+                bin_column.push(i as u32);
+                count_column.push(stats.counts[i]);
+                mean_column.push(stats.ld[i]);
+                m2_column.push(stats.ld_square[i]);
+            }
+        }
+    }
+    let mut file = BufWriter::new(
+        File::create(path).with_context(|| format!("Error creating blocks file {path}"))?,
+    );
+    file.write_all(BLOCKS_MAGIC)?;
+    file.write_all(&block_size.to_le_bytes())?;
+    file.write_all(&(bins.nbins as u32).to_le_bytes())?;
+    for edge in bins.left_edges_in_cm.iter().chain(&bins.right_edges_in_cm) {
+        file.write_all(&(edge / 100.0).to_le_bytes())?;
+    }
+    file.write_all(&(contig_column.len() as u64).to_le_bytes())?;
+    for column in [&contig_column, &block_column, &bin_column, &count_column] {
+        for value in column.iter() {
+            file.write_all(&value.to_le_bytes())?;
+        }
+    }
+    for column in [&mean_column, &m2_column] {
+        for value in column.iter() {
+            file.write_all(&value.to_le_bytes())?;
+        }
+    }
+    file.flush()?;
+    Ok(())
+}
+
+/// Raw per-bin state of a contig, which can be merged with the state of
+/// other runs or resumed with a tighter target. `seed` and `word_pos` locate
+/// the ChaCha stream where the run stopped, `seed` is None for merged states.
+#[derive(Debug)]
+pub struct ContigState {
+    pub contig: u32,
+    pub seed: Option<u64>,
+    pub word_pos: u128,
+    pub stats: SufficientSummaryStats,
+}
+
+const STATE_HEADER: &str = "#contig\tseed\tword_pos\tbin_index\tN\tmean\tM2";
+
+// One row per contig and bin. f64 are written in their shortest round-trip
+// representation, so reading a state back is exact.
+pub fn write_states(path: &str, states: &[ContigState]) -> Result<()> {
+    let mut file = BufWriter::new(
+        File::create(path).with_context(|| format!("Error creating state file {path}"))?,
+    );
+    writeln!(file, "{STATE_HEADER}")?;
+    for state in states {
+        let seed = state.seed.map_or("-".to_string(), |seed| seed.to_string());
+        for i in 0..state.stats.counts.len() {
+            writeln!(
+                file,
+                "{}\t{}\t{}\t{}\t{}\t{}\t{}",
+                state.contig,
+                seed,
+                state.word_pos,
+                i,
+                state.stats.counts[i],
+                state.stats.ld[i],
+                state.stats.ld_square[i]
+            )?;
+        }
+    }
+    file.flush()?;
+    Ok(())
+}
+
+// States in the order their contigs first appear in the file
+pub fn read_states(path: &str, bins: &Bins) -> Result<Vec<ContigState>> {
+    let file = File::open(path).with_context(|| format!("Error opening state file {path}"))?;
+    let mut states: Vec<ContigState> = Vec::new();
+    for (line_number, line) in BufReader::new(file).lines().enumerate() {
+        let line = line?;
+        if line.starts_with('#') || line.is_empty() {
+            continue;
+        }
+        let fields: Vec<&str> = line.split('\t').collect();
+        if fields.len() != 7 {
+            bail!("{path}:{}: expected 7 columns", line_number + 1);
+        }
+        let parse_error = || format!("{path}:{}: invalid value", line_number + 1);
+        let contig = fields[0].parse::<u32>().with_context(parse_error)?;
+        let seed = match fields[1] {
+            "-" => None,
+            seed => Some(seed.parse::<u64>().with_context(parse_error)?),
+        };
+        let word_pos = fields[2].parse::<u128>().with_context(parse_error)?;
+        let index = fields[3].parse::<usize>().with_context(parse_error)?;
+        if index >= bins.nbins {
+            bail!("{path}:{}: bin {index} out of range", line_number + 1);
+        }
+        if states.last().is_none_or(|state| state.contig != contig) {
+            states.push(ContigState {
+                contig,
+                seed,
+                word_pos,
+                stats: SufficientSummaryStats::new(bins),
+            });
+        }
+        let stats = &mut states.last_mut().unwrap().stats;
+        stats.counts[index] = fields[4].parse::<u32>().with_context(parse_error)?;
+        stats.ld[index] = fields[5].parse::<f64>().with_context(parse_error)?;
+        stats.ld_square[index] = fields[6].parse::<f64>().with_context(parse_error)?;
+    }
+    Ok(states)
+}
@@ -0,0 +1,93 @@
+import pandas as pd
+import numpy as np
+import sys
+from engine_fidelity import Z_THRESHOLD, summarize_engine, read_runtimes
+
+REFERENCE = "hudson"
+
+
+def read_peak_memory(benchmark_files: list) -> np.ndarray:
+    # Peak resident memory in MB from Snakemake benchmark files
+    return np.array(
+        [pd.read_csv(f, sep="\t")["max_rss"].iloc[0] for f in benchmark_files]
+    )
+
+
+def main(
+    models: list,
+    ld_files: dict,
+    benchmark_files: dict,
+    bins_outfile: str,
+    summary_outfile: str,
+) -> None:
+    reference = summarize_engine(ld_files[REFERENCE])
+    reference_seconds = read_runtimes(benchmark_files[REFERENCE]).mean()
+    bins = []
+    summary = []
+    for model in models:
+        ld = summarize_engine(ld_files[model])
+        diff = ld["mean"] - reference["mean"]
+        z = diff / np.sqrt(ld["se"] ** 2 + reference["se"] ** 2)
+        bins.append(
+            pd.DataFrame(
+                {
+                    "model": model,
+                    "mean": ld["mean"],
+                    "se": ld["se"],
+                    "relative_difference": diff / reference["mean"],
+                    "z": z,
+                }
+            ).reset_index()
+        )
+        seconds = read_runtimes(benchmark_files[model])
+        memory = read_peak_memory(benchmark_files[model])
+        summary.append(
+            {
+                "model": model,
+                "mean_seconds": seconds.mean(),
+                "speed_up": reference_seconds / seconds.mean(),
+                "max_rss_mb": memory.max(),
+                "max_abs_relative_difference": float(np.abs(diff / reference["mean"]).max()),
+                "max_abs_z": float(np.abs(z).max()) if model != REFERENCE else 0.0,
+                "biased_bins": int((np.abs(z) > Z_THRESHOLD).sum()),
+            }
+        )
+    bins = pd.concat(bins, ignore_index=True)
+    bins.to_csv(bins_outfile, index=False)
+    summary = pd.DataFrame(summary)
+    print(summary)
+    summary.to_csv(summary_outfile, index=False)
+    # Fastest model whose LD curve is indistinguishable from the exact coalescent
+    unbiased = summary[summary["biased_bins"] == 0]
+    best = unbiased.sort_values("mean_seconds").iloc[0]["model"]
+    print(f"Fastest model without biased bins (|z| > {Z_THRESHOLD}): {best}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 7:
+        print(
+            "Usage: python ancestry_model_benchmark.py <bins_outfile> <summary_outfile> <replicates> <models> <ld_files> <benchmark_files>"
+        )
+        print("  <models> is comma-separated, files are ordered by model then replicate")
+        sys.exit(1)
+    bins_outfile = sys.argv[1]
+    summary_outfile = sys.argv[2]
+    replicates = int(sys.argv[3])
+    models = sys.argv[4].split(",")
+    if REFERENCE not in models:
+        print(f"The reference model {REFERENCE} must be included")
+        sys.exit(1)
+    files = sys.argv[5:]
+    n = len(models) * replicates
+    if len(files) != 2 * n:
+        print(f"Expected {2 * n} input files, got {len(files)}")
+        sys.exit(1)
+    ld_files = {
+        model: files[i * replicates : (i + 1) * replicates]
+        for i, model in enumerate(models)
+    }
+    benchmark_files = {
+        model: files[n + i * replicates : n + (i + 1) * replicates]
+        for i, model in enumerate(models)
+    }
+    main(models, ld_files, benchmark_files, bins_outfile, summary_outfile)
@@ -0,0 +1,102 @@
+import pandas as pd
+import numpy as np
+import sys
+
+# Standardized differences above this flag bins where the engines disagree
+Z_THRESHOLD = 3
+
+
+def pooled_ld(ld_file: str) -> pd.Series:
+    # N-weighted mean LD per bin across the chromosomes of one replicate
+    df = pd.read_csv(
+        ld_file,
+        delimiter="\t",
+        comment="#",
+        names=["bin_index", "left_bin", "right_bin", "N", "mean", "var"],
+    )
+    df["weighted"] = df["N"] * df["mean"]
+    by_bin = df.groupby(["bin_index", "left_bin", "right_bin"])
+    return by_bin["weighted"].sum() / by_bin["N"].sum()
+
+
+def summarize_engine(ld_files: list) -> pd.DataFrame:
+    # Mean and standard error across replicates
+    replicates = pd.concat([pooled_ld(f) for f in ld_files], axis=1)
+    return pd.DataFrame(
+        {
+            "mean": replicates.mean(axis=1),
+            "se": replicates.std(axis=1) / np.sqrt(replicates.shape[1]),
+        }
+    )
+
+
+def read_runtimes(benchmark_files: list, column: str = "cpu_time") -> np.ndarray:
+    # Seconds from Snakemake benchmark files. The engines run with different
+    # numbers of threads, so they are compared on CPU time ("cpu_time", summed
+    # over the job's processes); wall clock ("s") is reported alongside.
+    return np.array([pd.read_csv(f, sep="\t")[column].iloc[0] for f in benchmark_files])
+
+
+def main(
+    slim_ld: list,
+    msprime_ld: list,
+    slim_benchmarks: list,
+    msprime_benchmarks: list,
+    bins_outfile: str,
+    runtime_outfile: str,
+) -> None:
+    slim = summarize_engine(slim_ld)
+    wf = summarize_engine(msprime_ld)
+    bins = slim.join(wf, lsuffix="_slim", rsuffix="_msprime").reset_index()
+    bins["difference"] = bins["mean_msprime"] - bins["mean_slim"]
+    bins["relative_difference"] = bins["difference"] / bins["mean_slim"]
+    bins["z"] = bins["difference"] / np.sqrt(bins["se_slim"] ** 2 + bins["se_msprime"] ** 2)
+    print(bins)
+    bins.to_csv(bins_outfile, index=False)
+    flagged = bins[np.abs(bins["z"]) > Z_THRESHOLD]
+    if len(flagged) > 0:
+        print(f"Engines disagree in {len(flagged)} bins (|z| > {Z_THRESHOLD})")
+        print(flagged[["bin_index", "left_bin", "right_bin", "z"]])
+
+    slim_seconds = read_runtimes(slim_benchmarks)
+    msprime_seconds = read_runtimes(msprime_benchmarks)
+    slim_wall = read_runtimes(slim_benchmarks, "s")
+    msprime_wall = read_runtimes(msprime_benchmarks, "s")
+    runtime = pd.DataFrame(
+        {
+            "engine": ["slim", "msprime"],
+            "replicates": [len(slim_seconds), len(msprime_seconds)],
+            "mean_cpu_seconds": [slim_seconds.mean(), msprime_seconds.mean()],
+            "median_cpu_seconds": [np.median(slim_seconds), np.median(msprime_seconds)],
+            "mean_wall_seconds": [slim_wall.mean(), msprime_wall.mean()],
+        }
+    )
+    print(runtime)
+    print(f"msprime speed-up in CPU time: {slim_seconds.mean() / msprime_seconds.mean():.1f}x")
+    runtime.to_csv(runtime_outfile, index=False)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 8:
+        print(
+            "Usage: python engine_fidelity.py <bins_outfile> <runtime_outfile> <replicates> <slim_ld_files> <msprime_ld_files> <slim_benchmark_files> <msprime_benchmark_files>"
+        )
+        sys.exit(1)
+    bins_outfile = sys.argv[1]
+    runtime_outfile = sys.argv[2]
+    replicates = int(sys.argv[3])
+    files = sys.argv[4:]
+    if len(files) != 4 * replicates:
+        print(f"Expected {4 * replicates} input files, got {len(files)}")
+        sys.exit(1)
+    slim_ld, msprime_ld, slim_benchmarks, msprime_benchmarks = (
+        files[i * replicates : (i + 1) * replicates] for i in range(4)
+    )
+    main(
+        slim_ld,
+        msprime_ld,
+        slim_benchmarks,
+        msprime_benchmarks,
+        bins_outfile,
+        runtime_outfile,
+    )
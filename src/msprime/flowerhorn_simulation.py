@@ -1,7 +1,9 @@
 import numpy as np
 import tskit, msprime
 import sys
-from concurrent.futures import ProcessPoolExecutor
+import time
+import resource
+from concurrent.futures import ProcessPoolExecutor, as_completed
 # Define constants of the model
 ANCIENT_NE1 = 15_000
 ANCIENT_NE2 = 25_000
@@ -10,8 +12,24 @@ CONTIG_LENGTH = 1e8
 SPLIT_TIME = 30_000
 RECOMBINATION_RATE = 1e-8
 MUTATION_RATE = 1e-8
+# Ancestry models, compared against the exact Hudson coalescent by
+# ancestry_model_benchmark.py
+ANCESTRY_MODELS = ("hudson", "smc", "smc_prime", "dtwf")
+# Recent generations simulated exactly by the "dtwf" hybrid
+DTWF_GENERATIONS = 100
 
-def simulation(seed: int, Ne_modern: int, Ne_founder: int, t_inv: int, n_samples: int, outfile: str)-> None:
+def ancestry_model(name: str):
+    if name in ("hudson", "smc", "smc_prime"):
+        return name
+    if name == "dtwf":
+        # Discrete-time Wright-Fisher over the invasion, Hudson before that
+        return [
+            msprime.DiscreteTimeWrightFisher(duration=DTWF_GENERATIONS),
+            msprime.StandardCoalescent(),
+        ]
+    raise ValueError(f"Unknown ancestry model {name}, expected one of {ANCESTRY_MODELS}")
+
+def simulation(seed: int, Ne_modern: int, Ne_founder: int, t_inv: int, n_samples: int, outfile: str, ancestry: str = "hudson")-> None:
     # Define demography
     alpha = (np.log(Ne_modern) - np.log(Ne_founder)) / t_inv
     demography = msprime.Demography()
@@ -27,32 +45,71 @@ def simulation(seed: int, Ne_modern: int, Ne_founder: int, t_inv: int, n_samples
         recombination_rate=RECOMBINATION_RATE,
         sequence_length=CONTIG_LENGTH,
         random_seed=seed,
-        demography=demography
+        demography=demography,
+        model=ancestry_model(ancestry)
     )
     mts = msprime.sim_mutations(ts, rate = MUTATION_RATE, random_seed=seed)
     mts.dump(outfile)
 
+def worker(seed: int, Ne_modern: int, Ne_founder: int, t_inv: int, n_samples: int, outfile: str, ancestry: str)-> dict:
+    # Module-level so that it can be pickled by ProcessPoolExecutor
+    start = time.perf_counter()
+    simulation(seed, Ne_modern, Ne_founder, t_inv, n_samples, outfile, ancestry)
+    return {
+        "seed": seed,
+        "outfile": outfile,
+        "seconds": time.perf_counter() - start,
+        # Peak resident memory of this worker process, in MB (ru_maxrss is in KB)
+        "peak_memory": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+def report(result: dict, done: int, total: int)-> None:
+    print(
+        f"[{done}/{total}] chromosome with seed {result['seed']} simulated in "
+        f"{result['seconds']:.0f}s (peak {result['peak_memory']:.0f} MB)",
+        flush=True
+    )
+
+def simulate_chromosomes(seeds, outfiles, recent_ne, founders_ne, t_inv, n_samples, threads, max_memory, ancestry="hudson")-> None:
+    args = [
+        (seed, recent_ne, founders_ne, t_inv, n_samples, outfile, ancestry)
+        for seed, outfile in zip(seeds, outfiles)
+    ]
+    total = len(args)
+    done = 0
+    # The first chromosome runs alone in a fresh process to measure its peak
+    # memory, then concurrency is capped so that the rest fit in the budget
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        result = executor.submit(worker, *args[0]).result()
+    done += 1
+    report(result, done, total)
+    workers = max(1, min(threads, int(max_memory // max(result["peak_memory"], 1))))
+    print(f"Simulating {total - done} chromosomes with {workers} workers", flush=True)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(worker, *a) for a in args[1:]]
+        for future in as_completed(futures):
+            done += 1
+            report(future.result(), done, total)
+
 if __name__ == "__main__":
-    if len(sys.argv) < 7:
-        print("Usage: python script.py <seed> <recent_ne> <founders_ne> <t_inv> <n_samples> <outfiles>")
+    if len(sys.argv) < 10:
+        print("Usage: python script.py <seed> <recent_ne> <founders_ne> <t_inv> <n_samples> <threads> <max_memory_mb> <ancestry> <outfiles>")
         sys.exit(1)
     seed = int(sys.argv[1])
     recent_ne = int(sys.argv[2])
     founders_ne = int(sys.argv[3])
     t_inv = int(sys.argv[4])
     n_samples = int(sys.argv[5])
+    threads = int(sys.argv[6])
+    max_memory = float(sys.argv[7])
+    ancestry = sys.argv[8]
+    if ancestry not in ANCESTRY_MODELS:
+        print(f"Unknown ancestry model {ancestry}, expected one of {ANCESTRY_MODELS}")
+        sys.exit(1)
     rng = np.random.default_rng(seed)
-    outfiles = sys.argv[6:]
+    outfiles = sys.argv[9:]
     seeds = rng.integers(1, 2**32, len(outfiles))
-    def worker(seed, outfile, recent_ne, founders_ne, t_inv, n_samples):
-        print(f"Simulating chromosome with seed {seed}")
-        simulation(seed, recent_ne, founders_ne, t_inv, n_samples, outfile)
-    with ProcessPoolExecutor() as executor:
-        futures = [
-            executor.submit(
-                worker, seed, outfile, recent_ne, founders_ne, t_inv, n_samples
-            )
-            for seed, outfile in zip(seeds, outfiles)
-        ]
-        for future in futures:
-            future.result()
+    start = time.perf_counter()
+    print(f"Ancestry model: {ancestry}")
+    simulate_chromosomes(seeds, outfiles, recent_ne, founders_ne, t_inv, n_samples, threads, max_memory, ancestry)
+    print(f"Simulated {len(outfiles)} chromosomes in {time.perf_counter() - start:.0f}s")
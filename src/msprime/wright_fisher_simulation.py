@@ -0,0 +1,107 @@
+# Run with src/slim and src/utils on PYTHONPATH, as the msprime rules do
+import numpy as np
+import tskit, msprime
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from mutation_overlay import record_overlay_seed
+from scenarios import (
+    ne_trajectory,
+    SAMPLE_SIZE,
+    ANCIENT_NE,
+    CONTIG_LENGTH,
+    RECOMBINATION_RATE,
+    MUTATION_RATE,
+    CONSTANT_RUNTIME,
+)
+
+def wright_fisher_demography(popsizes: np.ndarray)-> tuple:
+    # The SLiM models add POPSIZES[0] founders in cycle 1, whose offspring
+    # (cycle 1) keep that size; the offspring of cycle c >= 2 number
+    # POPSIZES[c] and those of cycle RUNTIME-1 are sampled. The founders are
+    # the roots that get recapitated with ANCIENT_NE.
+    # Going backwards, time t holds the offspring of cycle RUNTIME-1-t (the
+    # founders at t = RUNTIME-1), and the size in [t, t+1) is that of the
+    # parents' generation t+1, so the founder size applies on
+    # [RUNTIME-2, RUNTIME-1) and ANCIENT_NE from RUNTIME-1 on
+    generations = np.concatenate([[popsizes[0], popsizes[0]], popsizes[2:]])
+    sizes = generations[::-1]
+    forward_generations = len(sizes) - 1
+    demography = msprime.Demography()
+    demography.add_population(name="p0", initial_size=sizes[1])
+    for t in range(1, forward_generations):
+        if sizes[t + 1] != sizes[t]:
+            demography.add_population_parameters_change(
+                time=t, initial_size=sizes[t + 1], population="p0"
+            )
+    demography.add_population_parameters_change(
+        time=forward_generations, initial_size=ANCIENT_NE, population="p0"
+    )
+    return demography, forward_generations
+
+def simulation(seed: int, popsizes: np.ndarray, outfile: str, store_mutations: bool = True)-> None:
+    demography, forward_generations = wright_fisher_demography(popsizes)
+    # Discrete-time Wright-Fisher while the forward model would run,
+    # the Hudson coalescent for the recapitated ancestry
+    ts = msprime.sim_ancestry(
+        samples={"p0" : SAMPLE_SIZE},
+        demography=demography,
+        model=[
+            msprime.DiscreteTimeWrightFisher(duration=forward_generations),
+            msprime.StandardCoalescent(),
+        ],
+        recombination_rate=RECOMBINATION_RATE,
+        # SLiM positions run from 0 to L inclusive
+        sequence_length=int(CONTIG_LENGTH) + 1,
+        random_seed=seed,
+    )
+    # Without stored mutations, readers add them with mutation_overlay.load
+    if not store_mutations:
+        record_overlay_seed(ts, seed).dump(outfile)
+        return
+    mts = msprime.sim_mutations(ts, rate = MUTATION_RATE, random_seed=seed)
+    mts.dump(outfile)
+
+def worker(seed: int, popsizes: np.ndarray, outfile: str, store_mutations: bool)-> None:
+    print(f"Simulating chromosome with seed {seed}")
+    simulation(seed, popsizes, outfile, store_mutations)
+
+if __name__ == "__main__":
+    usage = (
+        "Usage: python script.py exponential_growth <seed> <recent_ne> <founders_ne> <t_inv> <threads> <stored|deferred> <outfiles>\n"
+        "       python script.py constant_recent_past <seed> <recent_ne> <threads> <stored|deferred> <outfiles>"
+    )
+    if len(sys.argv) < 2:
+        print(usage)
+        sys.exit(1)
+    scenario = sys.argv[1]
+    if scenario == "exponential_growth" and len(sys.argv) >= 9:
+        seed = int(sys.argv[2])
+        recent_ne = int(sys.argv[3])
+        founders_ne = int(sys.argv[4])
+        t_inv = int(sys.argv[5])
+        threads = int(sys.argv[6])
+        mutations = sys.argv[7]
+        outfiles = sys.argv[8:]
+        popsizes = ne_trajectory(recent_ne, founders_ne, t_inv)
+    elif scenario == "constant_recent_past" and len(sys.argv) >= 7:
+        seed = int(sys.argv[2])
+        recent_ne = int(sys.argv[3])
+        threads = int(sys.argv[4])
+        mutations = sys.argv[5]
+        outfiles = sys.argv[6:]
+        popsizes = np.repeat(recent_ne, CONSTANT_RUNTIME)
+    else:
+        print(usage)
+        sys.exit(1)
+    if mutations not in ("stored", "deferred"):
+        print(f"Unknown mutations mode {mutations}, expected stored or deferred")
+        sys.exit(1)
+    rng = np.random.default_rng(seed)
+    seeds = rng.integers(1, 2**32, len(outfiles))
+    with ProcessPoolExecutor(max_workers=threads) as executor:
+        futures = [
+            executor.submit(worker, seed, popsizes, outfile, mutations == "stored")
+            for seed, outfile in zip(seeds, outfiles)
+        ]
+        for future in futures:
+            future.result()
@@ -0,0 +1,339 @@
+import pandas as pd
+import numpy as np
+import pymc as pm
+import pytensor
+import pytensor.tensor as pt
+from pytensor.tensor.special import log_softmax
+import arviz as az
+import sys
+import time
+from scipy.special import softmax
+from scipy.stats import kstest
+from exponential_piecewise_nuts_boot import correct_r2, gauss
+
+# Amortized prior, wide enough to cover all simulated scenarios
+NE1_RANGE = (1_000, 100_000)  # log-uniform
+NE2_RANGE = (1_000, 100_000)  # log-uniform
+T0_RANGE = (5, 150)  # uniform
+MIN_FOUNDERS = 2  # founders log-uniform between this and Ne1
+PARAMS = ["Ne1", "Ne2", "t0", "founders"]
+# Mixture density network
+N_COMPONENTS = 5
+N_HIDDEN = 64
+COVERAGE_LEVELS = [0.5, 0.8, 0.95]
+# Batches of `draws` proposals before giving up on filling the prior support
+MAX_PROPOSAL_BATCHES = 100
+
+
+# Numpy version of expected_r2, vectorized over a batch of parameters
+def expected_r2_batch(u_col, Ne1, Ne2, alpha, t0, legendre_x, legendre_w):
+    Ne1, Ne2, alpha, t0 = (x[:, None, None] for x in (Ne1, Ne2, alpha, t0))
+    u = u_col[None, None, :]
+    small = np.abs(alpha) < 1e-5
+    # Avoid 0/0 in the unused branch of np.where
+    safe_alpha = np.where(small, 1.0, alpha)
+    with np.errstate(over="ignore"):
+        # First integral: [0, t0]
+        t = t0 / 2 * legendre_x[None, :, None] + t0 / 2
+        inner1 = (1 - np.exp(safe_alpha * t)) / (2 * Ne1 * safe_alpha)
+        res1 = np.exp(safe_alpha * t - 2 * t * u + inner1) / (2 * Ne1)
+        numerator = 4 * Ne1 + alpha * t * (4 * Ne1 - t)
+        res2 = numerator * np.exp(-t * (4 * Ne1 * u + 1) / (2 * Ne1)) / (8 * Ne1**2)
+        f1 = np.where(small, res2, res1)
+        integral1 = np.sum(f1 * legendre_w[None, :, None] * t0 / 2, axis=1)
+        # Second integral: [t0, ∞)
+        trans_x = (0.5 * legendre_x + 0.5)[None, :, None]
+        trans_w = (0.5 * legendre_w)[None, :, None]
+        t = t0 + trans_x / (1 - trans_x)
+        inner1 = (
+            Ne1 * safe_alpha * (t0 - t) + Ne2 * (1 - np.exp(safe_alpha * t0))
+        ) / (2 * Ne1 * Ne2 * safe_alpha)
+        res1 = np.exp(-2 * t * u + inner1) / (2 * Ne2)
+        inner2 = 4 * Ne1 - alpha * t0**2
+        exponent2 = (-4 * Ne1 * Ne2 * t * u + Ne1 * (t0 - t) - Ne2 * t0) / (
+            2 * Ne1 * Ne2
+        )
+        res2 = inner2 * np.exp(exponent2) / (8 * Ne1 * Ne2)
+        f2 = np.where(small, res2, res1)
+        integral2 = np.sum(f2 * trans_w / (1 - trans_x) ** 2, axis=1)
+    return integral1 + integral2  # shape (n_params, n_points)
+
+
+def read_ld_table(ld_file: str) -> pd.DataFrame:
+    return pd.read_csv(
+        ld_file,
+        delimiter="\t",
+        comment="#",
+        names=["bin_index", "left_bin", "right_bin", "N", "mean", "var"],
+    )
+
+
+# Pooled (N-weighted) mean LD per bin, the summary statistic the network sees
+def summarize(df: pd.DataFrame) -> np.ndarray:
+    df = df.assign(weighted=df["N"] * df["mean"])
+    by_bin = df.groupby("bin_index")
+    return (by_bin["weighted"].sum() / by_bin["N"].sum()).sort_index().values
+
+
+def sample_prior(n: int, rng) -> np.ndarray:
+    log_ne1 = rng.uniform(*np.log(NE1_RANGE), n)
+    log_ne2 = rng.uniform(*np.log(NE2_RANGE), n)
+    t0 = rng.uniform(*T0_RANGE, n)
+    log_founders = rng.uniform(np.log(MIN_FOUNDERS), log_ne1)
+    return np.column_stack([log_ne1, log_ne2, np.log(t0), log_founders])
+
+
+def in_support(theta: np.ndarray) -> np.ndarray:
+    log_ne1, log_ne2, log_t0, log_founders = theta.T
+    return (
+        (log_ne1 >= np.log(NE1_RANGE[0]))
+        & (log_ne1 <= np.log(NE1_RANGE[1]))
+        & (log_ne2 >= np.log(NE2_RANGE[0]))
+        & (log_ne2 <= np.log(NE2_RANGE[1]))
+        & (log_t0 >= np.log(T0_RANGE[0]))
+        & (log_t0 <= np.log(T0_RANGE[1]))
+        & (log_founders >= np.log(MIN_FOUNDERS))
+        & (log_founders <= log_ne1)
+    )
+
+
+# Expected binned LD plus noise matching the template table
+def simulate(theta: np.ndarray, template: pd.DataFrame, sample_size: int, rng):
+    df_bins = template.drop_duplicates("bin_index").sort_values("bin_index")
+    u_i = df_bins["left_bin"].values
+    u_j = df_bins["right_bin"].values
+    legendre_x, legendre_w = np.polynomial.legendre.leggauss(100)
+    u_points = np.array([gauss(a, b, 10)[0] for (a, b) in zip(u_i, u_j)])
+    u_weights = np.array([gauss(a, b, 10)[1] / (b - a) for (a, b) in zip(u_i, u_j)])
+    # Sampling noise of the pooled mean, from the spread across chromosomes
+    Nchrom = len(template) // len(df_bins)
+    se = (template.groupby("bin_index")["mean"].std() / np.sqrt(Nchrom)).values
+    log_ne1, log_ne2, log_t0, log_founders = theta.T
+    t0 = np.exp(log_t0)
+    alpha = (log_ne1 - log_founders) / t0
+    summaries = []
+    # Batches keep the (params, quadrature, points) intermediate small
+    for batch in np.array_split(np.arange(len(theta)), max(1, len(theta) // 200)):
+        r2 = expected_r2_batch(
+            u_points.flatten(),
+            np.exp(log_ne1[batch]),
+            np.exp(log_ne2[batch]),
+            alpha[batch],
+            t0[batch],
+            legendre_x,
+            legendre_w,
+        )
+        r2_per_bin = np.sum(r2.reshape(-1, *u_points.shape) * u_weights, axis=2)
+        summaries.append(correct_r2(r2_per_bin, sample_size))
+    summaries = np.concatenate(summaries)
+    return summaries + se * rng.standard_normal(summaries.shape)
+
+
+def init_weights(n_features: int, n_params: int, rng) -> dict:
+    def dense(n_in, n_out):
+        return rng.normal(0, np.sqrt(1 / n_in), (n_in, n_out)), np.zeros(n_out)
+
+    weights = {}
+    weights["W1"], weights["b1"] = dense(n_features, N_HIDDEN)
+    weights["W2"], weights["b2"] = dense(N_HIDDEN, N_HIDDEN)
+    weights["Wa"], weights["ba"] = dense(N_HIDDEN, N_COMPONENTS)
+    weights["Wm"], weights["bm"] = dense(N_HIDDEN, N_COMPONENTS * n_params)
+    weights["Ws"], weights["bs"] = dense(N_HIDDEN, N_COMPONENTS * n_params)
+    return weights
+
+
+# Mixture of diagonal Gaussians, works with both numpy and pytensor
+def mixture(x, weights, backend):
+    h = backend.tanh(x @ weights["W1"] + weights["b1"])
+    h = backend.tanh(h @ weights["W2"] + weights["b2"])
+    logits = h @ weights["Wa"] + weights["ba"]
+    means = (h @ weights["Wm"] + weights["bm"]).reshape((x.shape[0], N_COMPONENTS, -1))
+    log_sd = backend.clip(
+        (h @ weights["Ws"] + weights["bs"]).reshape((x.shape[0], N_COMPONENTS, -1)),
+        -7,
+        3,
+    )
+    return logits, means, log_sd
+
+
+def train(features, theta, seed: int, epochs: int = 200, batch_size: int = 256):
+    rng = np.random.default_rng(seed)
+    shared = {
+        name: pytensor.shared(value, name=name)
+        for name, value in init_weights(features.shape[1], theta.shape[1], rng).items()
+    }
+    x = pt.matrix("x")
+    y = pt.matrix("y")
+    logits, means, log_sd = mixture(x, shared, pt)
+    log_norm = pt.sum(
+        -0.5 * ((y[:, None, :] - means) / pt.exp(log_sd)) ** 2
+        - log_sd
+        - 0.5 * np.log(2 * np.pi),
+        axis=2,
+    )
+    log_mix = log_softmax(logits, axis=1) + log_norm
+    loss = -pt.mean(pt.logsumexp(log_mix, axis=1))
+    updates = pm.adam(loss, list(shared.values()), learning_rate=1e-3)
+    train_step = pytensor.function([x, y], loss, updates=updates)
+    evaluate = pytensor.function([x, y], loss)
+    # Hold out 10% of the simulations for early stopping
+    n_valid = len(features) // 10
+    order = rng.permutation(len(features))
+    valid, fit = order[:n_valid], order[n_valid:]
+    best_loss, best_weights, patience = np.inf, None, 0
+    for epoch in range(epochs):
+        fit = rng.permutation(fit)
+        for start in range(0, len(fit), batch_size):
+            batch = fit[start : start + batch_size]
+            train_step(features[batch], theta[batch])
+        valid_loss = float(evaluate(features[valid], theta[valid]))
+        print(f"Epoch {epoch}: validation loss {valid_loss:.4f}")
+        if valid_loss < best_loss:
+            best_loss, patience = valid_loss, 0
+            best_weights = {name: w.get_value().copy() for name, w in shared.items()}
+        else:
+            patience += 1
+            if patience >= 20:
+                break
+    return best_weights
+
+
+def sample_posterior(model: dict, summary: np.ndarray, draws: int, rng) -> np.ndarray:
+    x = ((summary - model["feature_mean"]) / model["feature_sd"])[None, :]
+    logits, means, log_sd = mixture(x, model, np)
+    samples = []
+    n_accepted = 0
+    # The mixture can put a little mass outside the prior support
+    for _ in range(MAX_PROPOSAL_BATCHES):
+        if n_accepted >= draws:
+            break
+        components = rng.choice(N_COMPONENTS, size=draws, p=softmax(logits[0]))
+        z = means[0, components] + np.exp(log_sd[0, components]) * rng.standard_normal(
+            (draws, means.shape[2])
+        )
+        z = z * model["theta_sd"] + model["theta_mean"]
+        z = z[in_support(z)]
+        samples.append(z)
+        n_accepted += len(z)
+    if n_accepted < draws:
+        raise RuntimeError(
+            f"Only {n_accepted} of {MAX_PROPOSAL_BATCHES * draws} proposals inside the prior "
+            f"support, the summary is likely outside the training range"
+        )
+    return np.concatenate(samples)[:draws]
+
+
+def calibration_report(model, template, sample_size, n_sims, draws, rng):
+    theta = sample_prior(n_sims, rng)
+    summaries = simulate(theta, template, sample_size, rng)
+    ranks = np.zeros((n_sims, theta.shape[1]))
+    for i in range(n_sims):
+        posterior = sample_posterior(model, summaries[i], draws, rng)
+        ranks[i] = np.mean(posterior < theta[i], axis=0)
+    rows = []
+    for j, param in enumerate(PARAMS):
+        # Uniform ranks mean a calibrated posterior (simulation-based calibration)
+        row = {"parameter": param, "rank_ks_pvalue": kstest(ranks[:, j], "uniform").pvalue}
+        for level in COVERAGE_LEVELS:
+            inside = np.abs(ranks[:, j] - 0.5) <= level / 2
+            row[f"coverage_{level}"] = inside.mean()
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def main_train(
+    template_file: str,
+    sample_size: int,
+    n_sims: int,
+    seed: int,
+    model_outfile: str,
+    report_outfile: str,
+    manifest_file: str = None,
+) -> None:
+    print(f"Running on PyMC v{pm.__version__}")
+    rng = np.random.default_rng(seed)
+    template = read_ld_table(template_file)
+    theta = sample_prior(n_sims, rng)
+    print(f"Simulating {n_sims} binned LD summaries from the expected r2 model")
+    features = simulate(theta, template, sample_size, rng)
+    # Optionally add simulated ld_binning tables with known parameters
+    if manifest_file is not None:
+        manifest = pd.read_csv(manifest_file)
+        print(f"Adding {len(manifest)} tables from {manifest_file}")
+        extra_theta = np.log(manifest[PARAMS].values.astype(float))
+        extra_features = np.array([summarize(read_ld_table(f)) for f in manifest["ld_file"]])
+        theta = np.concatenate([theta, extra_theta])
+        features = np.concatenate([features, extra_features])
+    model = {
+        "feature_mean": features.mean(axis=0),
+        "feature_sd": features.std(axis=0),
+        "theta_mean": theta.mean(axis=0),
+        "theta_sd": theta.std(axis=0),
+        "sample_size": np.array(sample_size),
+    }
+    weights = train(
+        (features - model["feature_mean"]) / model["feature_sd"],
+        (theta - model["theta_mean"]) / model["theta_sd"],
+        seed,
+    )
+    model.update(weights)
+    np.savez(model_outfile, **model)
+    report = calibration_report(model, template, sample_size, 500, 1000, rng)
+    print(report)
+    report.to_csv(report_outfile, index=False)
+
+
+def main_posterior(
+    model_file: str, ld_file: str, draws: int, seed: int, outfile: str
+) -> None:
+    model = dict(np.load(model_file))
+    print(f"Processing file: {ld_file}")
+    summary = summarize(read_ld_table(ld_file))
+    start = time.perf_counter()
+    samples = sample_posterior(model, summary, draws, np.random.default_rng(seed))
+    print(f"Sampled {draws} draws in {1000 * (time.perf_counter() - start):.1f} ms")
+    log_ne1, log_ne2, log_t0, log_founders = samples.T
+    posterior = {
+        "Ne1": np.exp(log_ne1),
+        "Ne2": np.exp(log_ne2),
+        "t0": np.exp(log_t0),
+        "founders": np.exp(log_founders),
+        "alpha": (log_ne1 - log_founders) / np.exp(log_t0),
+    }
+    idata = az.from_dict(posterior={k: v[None, :] for k, v in posterior.items()})
+    print(az.summary(idata, kind="stats"))
+    print("Saving data to NetCDF file...")
+    idata.to_netcdf(outfile)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) in (8, 9) and sys.argv[1] == "train":
+        template_file = sys.argv[2]
+        sample_size = int(sys.argv[3])
+        n_sims = int(sys.argv[4])
+        seed = int(sys.argv[5])
+        model_outfile = sys.argv[6]
+        report_outfile = sys.argv[7]
+        manifest_file = sys.argv[8] if len(sys.argv) == 9 else None
+        main_train(
+            template_file,
+            sample_size,
+            n_sims,
+            seed,
+            model_outfile,
+            report_outfile,
+            manifest_file,
+        )
+    elif len(sys.argv) == 7 and sys.argv[1] == "posterior":
+        model_file = sys.argv[2]
+        ld_file = sys.argv[3]
+        draws = int(sys.argv[4])
+        seed = int(sys.argv[5])
+        outfile = sys.argv[6]
+        main_posterior(model_file, ld_file, draws, seed, outfile)
+    else:
+        print(
+            "Usage: python amortized_npe.py train <template_ld_file> <sample_size> <n_sims> <seed> <model_file> <report_file> [manifest_file]\n"
+            "       python amortized_npe.py posterior <model_file> <ld_file> <draws> <seed> <output_file>"
+        )
+        sys.exit(1)
@@ -0,0 +1,110 @@
+import pandas as pd
+import numpy as np
+import pymc as pm
+import arviz as az
+import sys
+from exponential_piecewise_nuts_boot import (
+    PARAMETERIZATIONS,
+    build_model,
+    load_bootstrap_data,
+)
+
+# Parameters that matter for the fit, the raw variables differ across geometries
+VARS = ["Ne1", "Ne2", "t0", "founders"]
+
+
+def benchmark(data: dict, parameterization: str, seed: int, **model_args) -> dict:
+    model = build_model(data, parameterization=parameterization, **model_args)
+    with model:
+        # Same sampler settings as exponential_piecewise_nuts_boot.py
+        idata = pm.sample(
+            chains=1,
+            tune=2000,
+            draws=2000,
+            target_accept=0.90,
+            random_seed=seed,
+            init="advi+adapt_diag",
+        )
+    # Sampling time excludes compilation, which is shared by all geometries
+    seconds = idata.posterior.attrs["sampling_time"]
+    ess = az.ess(idata, var_names=VARS)
+    min_ess = min(float(ess[var].min()) for var in VARS)
+    diverging = idata.sample_stats["diverging"].values
+    return {
+        "parameterization": parameterization,
+        "seconds": seconds,
+        "min_ess_bulk": min_ess,
+        "ess_per_second": min_ess / seconds,
+        "divergences": int(diverging.sum()),
+        "divergence_rate": float(diverging.mean()),
+        "mean_tree_depth": float(idata.sample_stats["tree_depth"].mean()),
+    }
+
+
+def main(
+    datasets: list,
+    ne1_prior_sd: float,
+    t0_prior_mean: float,
+    t0_prior_sd: float,
+    alpha_logfold_prior_sd: float,
+    sample_size: int,
+    seed: int,
+    outfile: str,
+) -> None:
+    print(f"Running on PyMC v{pm.__version__}")
+    rows = []
+    for ld_file, ne_anc_file in datasets:
+        # Every geometry is fitted to the same bootstrap replicate
+        data = load_bootstrap_data(ld_file, ne_anc_file, seed, 0)
+        for parameterization in PARAMETERIZATIONS:
+            print(f"Benchmarking {parameterization} on {ld_file}")
+            row = benchmark(
+                data,
+                parameterization,
+                seed,
+                ne1_prior_sd=ne1_prior_sd,
+                t0_prior_mean=t0_prior_mean,
+                t0_prior_sd=t0_prior_sd,
+                alpha_logfold_prior_sd=alpha_logfold_prior_sd,
+                sample_size=sample_size,
+            )
+            row["ld_file"] = ld_file
+            print(row)
+            rows.append(row)
+    df = pd.DataFrame(rows)
+    df.to_csv(outfile, index=False)
+    # Aggregate across scenarios to pick the fastest stable geometry
+    summary = df.groupby("parameterization").agg(
+        median_ess_per_second=("ess_per_second", "median"),
+        min_ess_per_second=("ess_per_second", "min"),
+        mean_divergence_rate=("divergence_rate", "mean"),
+        max_divergence_rate=("divergence_rate", "max"),
+    )
+    print(summary.sort_values("median_ess_per_second", ascending=False))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 10 or len(sys.argv) % 2 != 0:
+        print(
+            "Usage: python benchmark_parameterizations.py <ne1_prior_sd> <t0_prior_mean> <t0_prior_sd> <alpha_logfold_prior_sd> <sample_size> <seed> <output_file> <ld_file> <ne_anc_file> [<ld_file> <ne_anc_file> ...]"
+        )
+        sys.exit(1)
+    ne1_prior_sd = float(sys.argv[1])
+    t0_prior_mean = float(sys.argv[2])
+    t0_prior_sd = float(sys.argv[3])
+    alpha_logfold_prior_sd = float(sys.argv[4])
+    sample_size = int(sys.argv[5])
+    seed = int(sys.argv[6])
+    outfile = sys.argv[7]
+    files = sys.argv[8:]
+    datasets = list(zip(files[::2], files[1::2]))
+    main(
+        datasets,
+        ne1_prior_sd,
+        t0_prior_mean,
+        t0_prior_sd,
+        alpha_logfold_prior_sd,
+        sample_size,
+        seed,
+        outfile,
+    )
@@ -0,0 +1,182 @@
+import pandas as pd
+import numpy as np
+import pymc as pm
+import arviz as az
+import sys
+import time
+from scipy.stats import norm
+from exponential_piecewise_nuts_boot import build_model, load_bootstrap_data
+
+# Yao et al. (2018): above 0.7 the variational approximation is not reliable
+KHAT_THRESHOLD = 0.7
+# Family-wise level of the posterior predictive checks of all bins, with a
+# Bonferroni correction for the number of bins
+PPC_THRESHOLD = 0.01
+
+
+# PSIS diagnostic of the mean-field approximation, computed on the unconstrained space
+def psis_khat(approx, model, draws: int, seed: int) -> float:
+    group = approx.groups[0]
+    mu = group.mean.eval()
+    sd = group.std.eval()
+    rng = np.random.default_rng(seed)
+    z = mu + sd * rng.standard_normal((draws, mu.size))
+    logq = norm.logpdf(z, mu, sd).sum(axis=1)
+    # Includes the Jacobian of the transforms and the likelihood potential
+    logp_fn = model.compile_logp()
+    logp = np.array(
+        [
+            logp_fn(
+                {
+                    name: point[slc].reshape(shape).astype(dtype)
+                    for name, (_, slc, shape, dtype) in group.ordering.items()
+                }
+            )
+            for point in z
+        ]
+    )
+    _, khat = az.psislw(logp - logq)
+    return float(khat)
+
+
+# Two-sided posterior predictive p-value of the pooled mean LD per bin
+def ppc_pvalues(idata, data: dict, seed: int) -> np.ndarray:
+    df = data["df"].assign(weighted=data["df"]["N"] * data["df"]["mean"])
+    by_bin = df.groupby("bin_index")
+    observed = (by_bin["weighted"].sum() / by_bin["N"].sum()).values
+    # Sampling noise of the pooled mean, from the spread across chromosomes
+    se = (by_bin["mean"].std() / np.sqrt(data["Nchrom"])).values
+    r2 = idata.posterior["r2"].values.reshape(-1, len(observed))
+    rng = np.random.default_rng(seed)
+    replicates = r2 + se * rng.standard_normal(r2.shape)
+    upper = np.mean(replicates >= observed, axis=0)
+    return 2 * np.minimum(upper, 1 - upper)
+
+
+def fit_advi(model, seed: int):
+    # Same settings as exponential_piecewise_nuts_boot_approx.py
+    with model:
+        mean_field = pm.fit(
+            obj_optimizer=pm.adagrad_window(learning_rate=1e-2), random_seed=seed
+        )
+        idata = mean_field.sample(draws=2000, random_seed=seed)
+    return mean_field, idata
+
+
+def fit_nuts(model, seed: int):
+    # Same settings as exponential_piecewise_nuts_boot.py
+    with model:
+        idata = pm.sample(
+            chains=1,
+            tune=2000,
+            draws=2000,
+            target_accept=0.90,
+            random_seed=seed,
+            init="advi+adapt_diag",
+        )
+    return idata
+
+
+def main(
+    ld_file: str,
+    ne_anc_file: str,
+    ne1_prior_sd: float,
+    t0_prior_mean: float,
+    t0_prior_sd: float,
+    alpha_logfold_prior_sd: float,
+    sample_size: int,
+    seed: int,
+    boot: int,
+    outfile: str,
+    record_file: str,
+) -> None:
+    print(f"Running on PyMC v{pm.__version__}")
+    data = load_bootstrap_data(ld_file, ne_anc_file, seed, boot)
+    model = build_model(
+        data,
+        ne1_prior_sd,
+        t0_prior_mean,
+        t0_prior_sd,
+        alpha_logfold_prior_sd,
+        sample_size,
+    )
+    # Cheap approximation first
+    start = time.perf_counter()
+    mean_field, idata = fit_advi(model, seed)
+    advi_seconds = time.perf_counter() - start
+    khat = psis_khat(mean_field, model, 2000, seed)
+    pvalues = ppc_pvalues(idata, data, seed)
+    min_pvalue = float(pvalues.min())
+    # Any bin failing at PPC_THRESHOLD / number of bins, same decision as Holm
+    adjusted_pvalue = min(1.0, len(pvalues) * min_pvalue)
+    print(
+        f"ADVI: PSIS k-hat={khat:.3f}, minimum PPC p-value={min_pvalue:.4f}"
+        f" (Bonferroni {adjusted_pvalue:.4f})"
+    )
+    # Escalate to full NUTS only when the approximation is not trustworthy
+    path = "advi"
+    nuts_seconds = np.nan
+    if khat > KHAT_THRESHOLD or adjusted_pvalue < PPC_THRESHOLD:
+        print("ADVI diagnostics failed, escalating to NUTS")
+        path = "nuts"
+        start = time.perf_counter()
+        idata = fit_nuts(model, seed)
+        nuts_seconds = time.perf_counter() - start
+    # Add log_likelihood to its own group
+    idata.add_groups(log_likelihood=idata.posterior.log_likelihood)
+    # and remove it from the posterior group
+    idata.posterior = idata.posterior.drop_vars("log_likelihood")
+    idata.posterior.attrs["inference_path"] = path
+
+    # Print summary statistics focusing on Ne
+    summary = az.summary(idata)
+    print(summary)
+    print("Saving data to NetCDF file...")
+    idata.to_netcdf(outfile)
+    record = pd.DataFrame(
+        {
+            "ld_file": [ld_file],
+            "seed": [seed],
+            "boot": [boot],
+            "path": [path],
+            "advi_khat": [khat],
+            "advi_min_ppc_pvalue": [min_pvalue],
+            "advi_adjusted_ppc_pvalue": [adjusted_pvalue],
+            "advi_seconds": [advi_seconds],
+            "nuts_seconds": [nuts_seconds],
+        }
+    )
+    record.to_csv(record_file, index=False)
+    return idata
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 12:
+        print(
+            "Usage: python exponential_piecewise_multifidelity_boot.py <ld_file> <ne_anc_file> <ne1_prior_sd> <t0_prior_mean> <t0_prior_sd> <alpha_logfold_prior_sd> <sample_size> <seed> <boot> <output_file> <record_file>"
+        )
+        sys.exit(1)
+    ld_file = sys.argv[1]
+    ne_anc_file = sys.argv[2]
+    ne1_prior_sd = float(sys.argv[3])
+    t0_prior_mean = float(sys.argv[4])
+    t0_prior_sd = float(sys.argv[5])
+    alpha_logfold_prior_sd = float(sys.argv[6])
+    sample_size = int(sys.argv[7])
+    seed = int(sys.argv[8])
+    boot = int(sys.argv[9])
+    outfile = sys.argv[10]
+    record_file = sys.argv[11]
+    main(
+        ld_file,
+        ne_anc_file,
+        ne1_prior_sd,
+        t0_prior_mean,
+        t0_prior_sd,
+        alpha_logfold_prior_sd,
+        sample_size,
+        seed,
+        boot,
+        outfile,
+        record_file,
+    )
@@ -78,21 +78,88 @@ def gauss(a, b, n=10):
     return x, w
 
 
-def main(
-    ld_file: str,
-    ne_anc_file: str,
+PARAMETERIZATIONS = ("truncated", "log_ne", "log_founders", "unconstrained")
+
+
+# Moment-matched log-normal, so log-scale priors keep the original mean and sd
+def lognormal_params(mean, sd):
+    sigma2 = np.log1p((sd / mean) ** 2)
+    return np.log(mean) - sigma2 / 2, np.sqrt(sigma2)
+
+
+def demographic_priors(
+    parameterization: str,
+    ne1_prior_mean: float,
     ne1_prior_sd: float,
+    ne2_prior_mean: float,
+    ne2_prior_sd: float,
     t0_prior_mean: float,
     t0_prior_sd: float,
     alpha_logfold_prior_sd: float,
-    sample_size: int,
-    seed: int,
-    boot: int,
-    outfile: str,
-) -> None:
-    print(f"Running on PyMC v{pm.__version__}")
-    print(f"Processing file: {ld_file}")
+):
+    """
+    Define the priors of (Ne1, Ne2, t0, alpha) inside the current model context.
 
+    All parameterizations expose the same deterministics (Ne1, Ne2, t0, alpha and
+    founders), so downstream code does not depend on the sampled geometry:
+    - truncated: truncated normals on the natural scale (the original model).
+    - log_ne: moment-matched log-normal priors on Ne1 and Ne2.
+    - log_founders: as log_ne, but samples the log-fold decline log(Ne1/founders)
+      instead of alpha. This removes the dependence of the alpha bound on Ne1.
+    - unconstrained: as log_founders, plus a log-normal prior on t0 so that every
+      free variable is an unconstrained standard normal.
+    """
+    if parameterization not in PARAMETERIZATIONS:
+        raise ValueError(
+            f"Unknown parameterization {parameterization}, expected one of {PARAMETERIZATIONS}"
+        )
+    if parameterization == "truncated":
+        # We use a truncated normal with variance to make things easier for NUTS
+        # but restrict Ne(t) to be positive
+        Ne1_raw = pm.TruncatedNormal(
+            "Ne1_raw", mu=0, sigma=1, lower=-ne1_prior_mean / ne1_prior_sd
+        )
+        Ne1 = pm.Deterministic("Ne1", ne1_prior_mean + ne1_prior_sd * Ne1_raw)
+        Ne2_raw = pm.TruncatedNormal(
+            "Ne2_raw", mu=0, sigma=1, lower=-ne2_prior_mean / ne2_prior_sd
+        )
+        Ne2 = pm.Deterministic("Ne2", ne2_prior_mean + ne2_prior_sd * Ne2_raw)
+    else:
+        mu, sigma = lognormal_params(ne1_prior_mean, ne1_prior_sd)
+        log_Ne1_raw = pm.Normal("log_Ne1_raw", mu=0, sigma=1)
+        Ne1 = pm.Deterministic("Ne1", pt.exp(mu + sigma * log_Ne1_raw))
+        mu, sigma = lognormal_params(ne2_prior_mean, ne2_prior_sd)
+        log_Ne2_raw = pm.Normal("log_Ne2_raw", mu=0, sigma=1)
+        Ne2 = pm.Deterministic("Ne2", pt.exp(mu + sigma * log_Ne2_raw))
+    if parameterization == "unconstrained":
+        mu, sigma = lognormal_params(t0_prior_mean, t0_prior_sd)
+        log_t0_raw = pm.Normal("log_t0_raw", mu=0, sigma=1)
+        t0 = pm.Deterministic("t0", pt.exp(mu + sigma * log_t0_raw))
+    else:
+        t0_raw = pm.TruncatedNormal(
+            "t0_raw", mu=0, sigma=1, lower=-t0_prior_mean / t0_prior_sd
+        )
+        t0 = pm.Deterministic("t0", t0_prior_mean + t0_prior_sd * t0_raw)
+    if parameterization in ("truncated", "log_ne"):
+        # We have to restrict combination that lead to a Ne(t0) < 1
+        alpha_raw = pm.TruncatedNormal(
+            "alpha_raw", mu=0, sigma=1, upper=pt.log(Ne1) / alpha_logfold_prior_sd
+        )
+        alpha = pm.Deterministic("alpha", alpha_raw * alpha_logfold_prior_sd / t0)
+        pm.Deterministic("founders", Ne1 * pt.exp(-alpha * t0))
+    else:
+        # alpha * t0 = log(Ne1 / founders), so we sample the log-fold decline
+        # directly. Ne(t0) < 1 has negligible prior mass and is not truncated.
+        logfold_raw = pm.Normal("logfold_raw", mu=0, sigma=1)
+        pm.Deterministic(
+            "founders", Ne1 * pt.exp(-logfold_raw * alpha_logfold_prior_sd)
+        )
+        alpha = pm.Deterministic("alpha", logfold_raw * alpha_logfold_prior_sd / t0)
+    return Ne1, Ne2, t0, alpha
+
+
+def load_bootstrap_data(ld_file: str, ne_anc_file: str, seed: int, boot: int) -> dict:
+    print(f"Processing file: {ld_file}")
     # Read data
     df = pd.read_csv(
         ld_file,
@@ -105,8 +172,6 @@ def main(
     # Get unique bin parameters
     df_bins = df.drop_duplicates("bin_index")[["bin_index", "left_bin", "right_bin"]]
     df_bins = df_bins.sort_values("bin_index")
-    u_i = df_bins["left_bin"].values
-    u_j = df_bins["right_bin"].values
     Nbins = len(df_bins)
     Nchrom = Nrows // Nbins
     # Add chromosome index
@@ -118,46 +183,49 @@ def main(
     rng = np.random.default_rng(seed + boot)
     indexes = rng.choice(chromosomes, Nchrom)
     df = pd.concat([df[df["chromosome_index"] == index] for index in indexes])
+    print("Processing file:", ne_anc_file)
+    ne_df = pd.read_csv(ne_anc_file)
+    # Take the sample with replacement
+    ne_df = ne_df.iloc[indexes]
+    return {"df": df, "df_bins": df_bins, "Nchrom": Nchrom, "ne_df": ne_df}
+
+
+def build_model(
+    data: dict,
+    ne1_prior_sd: float,
+    t0_prior_mean: float,
+    t0_prior_sd: float,
+    alpha_logfold_prior_sd: float,
+    sample_size: int,
+    parameterization: str = "truncated",
+) -> pm.Model:
+    df = data["df"]
+    df_bins = data["df_bins"]
+    Nchrom = data["Nchrom"]
+    u_i = df_bins["left_bin"].values
+    u_j = df_bins["right_bin"].values
     # Calculate expected_sigma2 per bin
     sigma2_per_bin = df.groupby("bin_index")["var"].mean().sort_index().values
     # Get bin indices for each row (make sure they match the ordered bins)
     bin_indices = np.array(
         [np.where(df_bins["bin_index"].values == b)[0][0] for b in df["bin_index"]]
     )
-    print("Processing file:", ne_anc_file)
-    ne_df = pd.read_csv(ne_anc_file)
-    # Take the sample with replacement
-    ne_df = ne_df.iloc[indexes]
     # Calcula mean and std of the Ne values across all chromosomes
-    ne1_prior_mean = ne2_prior_mean = ne_df["Ne"].mean()
-    ne2_prior_sd = ne_df["Ne"].std()
+    ne1_prior_mean = ne2_prior_mean = data["ne_df"]["Ne"].mean()
+    ne2_prior_sd = data["ne_df"]["Ne"].std()
     print("Ne2 prior mean:", ne2_prior_mean)
     print("Ne2 prior std:", ne2_prior_sd)
     with pm.Model() as model:
-        # Prior for Ne1
-        # We use a truncated normal with variance to make things easier for NUTS
-        # but restrict Ne(t) to be positive
-        Ne1_raw = pm.TruncatedNormal(
-            "Ne1_raw", mu=0, sigma=1, lower=-ne1_prior_mean / ne1_prior_sd
-        )
-        Ne1 = pm.Deterministic("Ne1", ne1_prior_mean + ne1_prior_sd * Ne1_raw)
-        # Prior for Ne2
-        Ne2_raw = pm.TruncatedNormal(
-            "Ne2_raw", mu=0, sigma=1, lower=-ne2_prior_mean / ne2_prior_sd
-        )
-        Ne2 = pm.Deterministic("Ne2", ne2_prior_mean + ne2_prior_sd * Ne2_raw)
-        # Prior for t0
-        t0_raw = pm.TruncatedNormal(
-            "t0_raw", mu=0, sigma=1, lower=-t0_prior_mean / t0_prior_sd
-        )
-        t0 = pm.Deterministic("t0", t0_prior_mean + t0_prior_sd * t0_raw)
-        # Prior for alpha
-        # We have to restrict combination that lead to a Ne(t0) < 1
-        alpha_raw = pm.TruncatedNormal(
-            "alpha_raw", mu=0, sigma=1, upper=pt.log(Ne1) / alpha_logfold_prior_sd
+        Ne1, Ne2, t0, alpha = demographic_priors(
+            parameterization,
+            ne1_prior_mean,
+            ne1_prior_sd,
+            ne2_prior_mean,
+            ne2_prior_sd,
+            t0_prior_mean,
+            t0_prior_sd,
+            alpha_logfold_prior_sd,
         )
-        alpha = pm.Deterministic("alpha", alpha_raw * alpha_logfold_prior_sd / t0)
-        pm.Deterministic("founders", Ne1 * pt.exp(-alpha * t0))
 
         # Numerical integration across both time (0->Inf) and bin
         # Per timepoint points and weights
@@ -190,7 +258,35 @@ def main(
             "log_likelihood", pt.sum(log_lik.reshape((-1, Nchrom)), axis=0)
         )
         pm.Potential("likelihood", pt.sum(pointwise_loglik))
+    return model
+
 
+def main(
+    ld_file: str,
+    ne_anc_file: str,
+    ne1_prior_sd: float,
+    t0_prior_mean: float,
+    t0_prior_sd: float,
+    alpha_logfold_prior_sd: float,
+    sample_size: int,
+    seed: int,
+    boot: int,
+    outfile: str,
+    parameterization: str = "truncated",
+) -> None:
+    print(f"Running on PyMC v{pm.__version__}")
+    print(f"Using the {parameterization} parameterization")
+    data = load_bootstrap_data(ld_file, ne_anc_file, seed, boot)
+    model = build_model(
+        data,
+        ne1_prior_sd,
+        t0_prior_mean,
+        t0_prior_sd,
+        alpha_logfold_prior_sd,
+        sample_size,
+        parameterization,
+    )
+    with model:
         # Sample from the posterior
         idata = pm.sample(
             chains=1,
@@ -216,9 +312,9 @@ def main(
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 11:
+    if len(sys.argv) not in (11, 12):
         print(
-            "Usage: python exponential_piecewise_nuts_boot.py <ld_file> <ne_anc_file> <ne1_prior_sd> <t0_prior_mean> <t0_prior_sd> <alpha_logfold_prior_sd> <sample_size> <seed> <boot> <output_file>"
+            "Usage: python exponential_piecewise_nuts_boot.py <ld_file> <ne_anc_file> <ne1_prior_sd> <t0_prior_mean> <t0_prior_sd> <alpha_logfold_prior_sd> <sample_size> <seed> <boot> <output_file> [parameterization]"
         )
         sys.exit(1)
     ld_file = sys.argv[1]
@@ -231,6 +327,7 @@ if __name__ == "__main__":
     seed = int(sys.argv[8])
     boot = int(sys.argv[9])
     outfile = sys.argv[10]
+    parameterization = sys.argv[11] if len(sys.argv) == 12 else "truncated"
     main(
         ld_file,
         ne_anc_file,
@@ -242,4 +339,5 @@ if __name__ == "__main__":
         seed,
         boot,
         outfile,
+        parameterization,
     )
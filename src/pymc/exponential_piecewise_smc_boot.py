@@ -0,0 +1,132 @@
+import numpy as np
+import pymc as pm
+import arviz as az
+import xarray as xr
+import sys
+from scipy.special import logsumexp
+from exponential_piecewise_nuts_boot import build_model, load_bootstrap_data
+
+KERNELS = {"MH": pm.smc.kernels.MH, "IMH": pm.smc.kernels.IMH}
+
+
+def stage_values(values: np.ndarray) -> list:
+    # Per-stage values of each SMC run. sample_smc stores them as a
+    # (chain, stage) object array when all runs took the same number of
+    # stages, and as a (1, chain) array of lists otherwise
+    if np.ndim(values.flat[0]) == 1:
+        return [np.asarray(run, dtype=float) for run in values.ravel()]
+    return [np.asarray(run, dtype=float) for run in values]
+
+
+def log_marginal_likelihood(idata) -> float:
+    # One estimate per independent SMC run: the value accumulated at the last stage
+    lml = idata.sample_stats["log_marginal_likelihood"].values
+    per_chain = np.array([run[-1] for run in stage_values(lml)])
+    # Unbiased on the natural scale, so we average the runs with log-mean-exp
+    return float(logsumexp(per_chain) - np.log(len(per_chain)))
+
+
+def main(
+    ld_file: str,
+    ne_anc_file: str,
+    ne1_prior_sd: float,
+    t0_prior_mean: float,
+    t0_prior_sd: float,
+    alpha_logfold_prior_sd: float,
+    sample_size: int,
+    seed: int,
+    boot: int,
+    cores: int,
+    draws: int,
+    outfile: str,
+    parameterization: str = "truncated",
+    kernel: str = "MH",
+) -> None:
+    print(f"Running on PyMC v{pm.__version__}")
+    print(f"Using the {parameterization} parameterization")
+    data = load_bootstrap_data(ld_file, ne_anc_file, seed, boot)
+    model = build_model(
+        data,
+        ne1_prior_sd,
+        t0_prior_mean,
+        t0_prior_sd,
+        alpha_logfold_prior_sd,
+        sample_size,
+        parameterization,
+    )
+    with model:
+        # Tempered SMC, one independent population of particles per core.
+        # The random-walk MH kernel copes better with curved (t0, alpha)
+        # posteriors than the independent proposal of IMH.
+        idata = pm.sample_smc(
+            draws=draws,
+            kernel=KERNELS[kernel],
+            chains=cores,
+            cores=cores,
+            random_seed=seed,
+        )
+        # Add log_likelihood to its own group
+        idata.add_groups(log_likelihood=idata.posterior.log_likelihood)
+        # and remove it from the posterior group
+        idata.posterior = idata.posterior.drop_vars("log_likelihood")
+    lml = log_marginal_likelihood(idata)
+    # The per-stage statistics of sample_smc (beta, log_marginal_likelihood,
+    # acceptance rates) are object arrays that NetCDF cannot store, so only
+    # the last stage of each run is kept, as floats
+    last_stage = {
+        name: ("chain", [run[-1] for run in stage_values(values.values)])
+        for name, values in idata.sample_stats.items()
+    }
+    idata.sample_stats = xr.Dataset(
+        last_stage,
+        coords={"chain": idata.posterior.chain},
+        attrs={**idata.sample_stats.attrs, "log_marginal_likelihood": lml},
+    )
+    print(f"Log marginal likelihood: {lml}")
+
+    # Print summary statistics focusing on Ne
+    summary = az.summary(idata)
+    print(summary)
+    loo = az.loo(idata)
+    print(loo)
+    print("Saving data to NetCDF file...")
+    idata.to_netcdf(outfile)
+    return idata
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (13, 14, 15):
+        print(
+            "Usage: python exponential_piecewise_smc_boot.py <ld_file> <ne_anc_file> <ne1_prior_sd> <t0_prior_mean> <t0_prior_sd> <alpha_logfold_prior_sd> <sample_size> <seed> <boot> <cores> <draws> <output_file> [parameterization] [kernel]"
+        )
+        sys.exit(1)
+    ld_file = sys.argv[1]
+    ne_anc_file = sys.argv[2]
+    ne1_prior_sd = float(sys.argv[3])
+    t0_prior_mean = float(sys.argv[4])
+    t0_prior_sd = float(sys.argv[5])
+    alpha_logfold_prior_sd = float(sys.argv[6])
+    sample_size = int(sys.argv[7])
+    seed = int(sys.argv[8])
+    boot = int(sys.argv[9])
+    cores = int(sys.argv[10])
+    draws = int(sys.argv[11])
+    outfile = sys.argv[12]
+    parameterization = sys.argv[13] if len(sys.argv) > 13 else "truncated"
+    kernel = sys.argv[14] if len(sys.argv) > 14 else "MH"
+    main(
+        ld_file,
+        ne_anc_file,
+        ne1_prior_sd,
+        t0_prior_mean,
+        t0_prior_sd,
+        alpha_logfold_prior_sd,
+        sample_size,
+        seed,
+        boot,
+        cores,
+        draws,
+        outfile,
+        parameterization,
+        kernel,
+    )
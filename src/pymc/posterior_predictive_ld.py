@@ -0,0 +1,120 @@
+import pandas as pd
+import numpy as np
+import arviz as az
+import sys
+from scipy.stats import norm
+
+VARS = ["Ne1", "Ne2", "t0", "founders", "alpha"]
+QUANTILES = [0.025, 0.5, 0.975]
+
+
+def main(
+    inference_file: str,
+    ld_file: str,
+    seed: int,
+    summary_outfile: str,
+    params_outfile: str,
+) -> None:
+    print(f"Processing file: {ld_file}")
+    df = pd.read_csv(
+        ld_file,
+        delimiter="\t",
+        comment="#",
+        names=["bin_index", "left_bin", "right_bin", "N", "mean", "var"],
+    )
+    df_bins = df.drop_duplicates("bin_index")[["bin_index", "left_bin", "right_bin"]]
+    df_bins = df_bins.sort_values("bin_index").reset_index(drop=True)
+    Nbins = len(df_bins)
+    bin_indices = np.array(
+        [np.where(df_bins["bin_index"].values == b)[0][0] for b in df["bin_index"]]
+    )
+    # One-hot (rows, bins) matrix to aggregate rows per bin with a matmul
+    onehot = np.zeros((len(df), Nbins))
+    onehot[np.arange(len(df)), bin_indices] = 1.0
+    N = df["N"].values.astype(float)
+    rows_per_bin = onehot.sum(axis=0)
+    N_per_bin = N @ onehot
+    # Same noise model as the composite likelihood: mean ~ Normal(r2, sigma2 / N)
+    sigma2_per_bin = (df["var"].values @ onehot) / rows_per_bin
+
+    print(f"Processing file: {inference_file}")
+    idata = az.from_netcdf(inference_file)
+    r2 = idata.posterior["r2"].values.reshape(-1, Nbins)  # (draws, bins)
+    Ndraws = r2.shape[0]
+
+    # Replicate every (chromosome, bin) mean for all draws at once
+    rng = np.random.default_rng(seed)
+    sd_rows = np.sqrt(sigma2_per_bin[bin_indices] / N)
+    replicates = r2[:, bin_indices] + sd_rows * rng.standard_normal((Ndraws, len(df)))
+    # Pooled (N-weighted) mean per bin
+    pooled = (replicates * N) @ onehot / N_per_bin
+    pooled_observed = (df["mean"].values * N) @ onehot / N_per_bin
+    # Spread of the per-chromosome means per bin
+    mean_rows = replicates @ onehot / rows_per_bin
+    std_rep = np.sqrt(
+        ((replicates**2) @ onehot / rows_per_bin - mean_rows**2)
+        * rows_per_bin
+        / (rows_per_bin - 1)
+    )
+    std_observed = df.groupby("bin_index")["mean"].std().sort_index().values
+    # Band of the model noise for a single chromosome, sigma2 / N, pooling
+    # draws and chromosomes of each bin. Narrower than the observed spread
+    # across chromosomes, which also carries the chromosome-to-chromosome
+    # variation of the genealogies.
+    chrom_bands = np.array(
+        [np.quantile(replicates[:, bin_indices == b], QUANTILES) for b in range(Nbins)]
+    )
+
+    # Band of the PPC figure: normal around the posterior mean r2 with the
+    # observed standard deviation of the per-chromosome means
+    spread_bands = norm.ppf(np.array(QUANTILES)[:, None], r2.mean(axis=0), std_observed)
+
+    pooled_bands = np.quantile(pooled, QUANTILES, axis=0)
+    std_bands = np.quantile(std_rep, QUANTILES, axis=0)
+    summary = pd.DataFrame(
+        {
+            "bin_index": df_bins["bin_index"],
+            "left_bin": df_bins["left_bin"],
+            "right_bin": df_bins["right_bin"],
+            "midpoint": (df_bins["left_bin"] + df_bins["right_bin"]) / 2,
+            "r2_mean": r2.mean(axis=0),
+            "pooled_observed": pooled_observed,
+            "pooled_lower": pooled_bands[0],
+            "pooled_median": pooled_bands[1],
+            "pooled_upper": pooled_bands[2],
+            "pooled_tail_prob": np.mean(pooled >= pooled_observed, axis=0),
+            "chrom_lower": chrom_bands[:, 0],
+            "chrom_median": chrom_bands[:, 1],
+            "chrom_upper": chrom_bands[:, 2],
+            "spread_lower": spread_bands[0],
+            "spread_upper": spread_bands[2],
+            "std_observed": std_observed,
+            "std_lower": std_bands[0],
+            "std_upper": std_bands[2],
+            "std_tail_prob": np.mean(std_rep >= std_observed, axis=0),
+        }
+    )
+    print(summary)
+    summary.to_csv(summary_outfile, index=False)
+    # Posterior means of the demographic parameters, for figure titles
+    params = pd.DataFrame(
+        {
+            "parameter": VARS,
+            "mean": [float(idata.posterior[var].mean()) for var in VARS],
+        }
+    )
+    params.to_csv(params_outfile, index=False)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 6:
+        print(
+            "Usage: python posterior_predictive_ld.py <inference_file> <ld_file> <seed> <summary_outfile> <params_outfile>"
+        )
+        sys.exit(1)
+    inference_file = sys.argv[1]
+    ld_file = sys.argv[2]
+    seed = int(sys.argv[3])
+    summary_outfile = sys.argv[4]
+    params_outfile = sys.argv[5]
+    main(inference_file, ld_file, seed, summary_outfile, params_outfile)
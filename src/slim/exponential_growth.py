@@ -1,22 +1,24 @@
 import numpy as np
 from slimwrap import SLiMModel
-import tskit, pyslim, msprime
-import tempfile, sys, os
+from postprocessing import PostProcessing, simulate_multi, simulate_single
+from scenarios import SAMPLE_SIZE, ANCIENT_NE, CONTIG_LENGTH, RECOMBINATION_RATE, MUTATION_RATE, ne_trajectory
+import pandas as pd
+import sys
 
-# Define constants of the model
-SAMPLE_SIZE = 200
-ANCIENT_NE = 15_000
-CONTIG_LENGTH = 1e8
-RECOMBINATION_RATE = 1e-8
-MUTATION_RATE = 1e-8
 MODEL_CODE = """
 initialize() {
 	initializeTreeSeq();
 	initializeMutationRate(0);
 	initializeMutationType("m1", 0.5, "f", 0.0);
 	initializeGenomicElementType("g1", m1, 1.0);
-	initializeGenomicElement(g1, 0, L);
-	initializeRecombinationRate(RHO);
+	// NCHROM chromosomes of L+1 bases, each followed by a spacer base where
+	// crossovers happen with probability 0.5 (see slimwrap.split_chromosomes)
+	defineConstant("STRIDE", L + 2);
+	starts = (0:(NCHROM-1)) * STRIDE;
+	ends = sort(c(starts + L, starts + L + 1));
+	rates = rep(c(RHO, 0.5), NCHROM);
+	initializeGenomicElement(g1, 0, ends[2*NCHROM-2]);
+	initializeRecombinationRate(rates[0:(2*NCHROM-2)], ends[0:(2*NCHROM-2)]);
 	// This code assumes a POPSIZES vector exists
 	defineConstant("RUNTIME", length(POPSIZES));
 }
@@ -31,56 +33,50 @@ initialize() {
 }
 """
 
-def ne_trajectory(Ne_modern: int, Ne_founder: int, runtime: int)-> np.ndarray:
-    # We aim to fit a exponential growth
-    # Ne(t) = Ne1 * exp(-\alpha * t)
-    # Ne_founder = Ne1 * exp(-\alpha * runtime)
-    # alpha = (log(Ne1) - log(Ne_founder)) / runtime
-    # alpha <- (log(Ne1) - log(Ne_founder)) / runtime
-    alpha = (np.log(Ne_modern) - np.log(Ne_founder)) / runtime
-    return np.flip(Ne_modern * np.exp(-alpha*np.arange(runtime))).astype(int)
-
-def simulation(seed: int, Ne_modern: int, Ne_founder: int, t_inv: int, outfile: str)-> None:
-    # Run SLiM simulation
-    model = SLiMModel(model_code=MODEL_CODE)
-    with tempfile.NamedTemporaryFile(delete=False) as temp_outfile:
-        params = {
-            "L" : int(CONTIG_LENGTH),
-            "RHO" : RECOMBINATION_RATE,
-            "POPSIZES" :ne_trajectory(Ne_modern, Ne_founder, t_inv),
-            "OUTFILE" : temp_outfile.name
-        }
-        model.run(seed=seed, constants=params)
-        ts = tskit.load(temp_outfile.name)
-    # Take sample of individuals
-    rng = np.random.default_rng(seed=seed)
-    alive_inds = pyslim.individuals_alive_at(ts, 0)
-    keep_indivs = rng.choice(alive_inds, SAMPLE_SIZE, replace=False)
-    keep_nodes = []
-    for i in keep_indivs:
-        keep_nodes.extend(ts.individual(i).nodes)
-    sts = ts.simplify(keep_nodes, keep_input_roots=True)
-    # Recapitation
-    rts = pyslim.recapitate(
-            sts, ancestral_Ne=ANCIENT_NE,
-            recombination_rate=RECOMBINATION_RATE,
-            random_seed=seed
-    )
-    # Add neutral mutations
-    mts = msprime.sim_mutations(rts, rate = MUTATION_RATE)
-    mts.dump(outfile)
-
 if __name__ == "__main__":
-    if len(sys.argv) < 6:
-        print("Usage: python script.py <seed> <recent_ne> <founders_ne> <t_inv> <outfiles>")
+    if len(sys.argv) < 11:
+        print("Usage: python script.py <seed> <recent_ne> <founders_ne> <t_inv> <threads> <max_memory_mb> <single|multi> <stored|deferred> <ballpark_ne_file> <outfiles>")
         sys.exit(1)
     seed = int(sys.argv[1])
     recent_ne = int(sys.argv[2])
     founders_ne = int(sys.argv[3])
     t_inv = int(sys.argv[4])
+    threads = int(sys.argv[5])
+    max_memory = float(sys.argv[6])
+    mode = sys.argv[7]
+    if mode not in ("single", "multi"):
+        print(f"Unknown mode {mode}, expected single or multi")
+        sys.exit(1)
+    mutations = sys.argv[8]
+    if mutations not in ("stored", "deferred"):
+        print(f"Unknown mutations option {mutations}, expected stored or deferred")
+        sys.exit(1)
+    # Deferred mutations are added when the files are read, see src/utils/mutation_overlay.py
+    pipeline = PostProcessing(
+        SAMPLE_SIZE,
+        ANCIENT_NE,
+        RECOMBINATION_RATE,
+        MUTATION_RATE,
+        store_mutations=mutations == "stored",
+    )
+    ballpark_file = sys.argv[9]
     rng = np.random.default_rng(seed)
-    outfiles = sys.argv[5:]
+    outfiles = sys.argv[10:]
     seeds = rng.integers(1, 2**32, len(outfiles))
-    for outfile, seed in zip(outfiles, seeds):
-        print(f"Simulating chromosome with seed {seed}")
-        simulation(seed, recent_ne, founders_ne, t_inv, outfile)
+    popsizes = ne_trajectory(recent_ne, founders_ne, t_inv)
+    # Validated once and reused for every chromosome
+    with SLiMModel(model_code=MODEL_CODE) as model:
+        constants = {"L" : int(CONTIG_LENGTH), "RHO" : RECOMBINATION_RATE, "POPSIZES" : popsizes}
+        if mode == "single":
+            failed, summaries = simulate_single(
+                model, pipeline, seeds, outfiles, constants, threads, max_memory
+            )
+        else:
+            failed, summaries = simulate_multi(model, pipeline, seeds, outfiles, constants)
+    if failed:
+        print(f"SLiM failed for seeds {failed}", file=sys.stderr)
+        sys.exit(1)
+    # Same table as src/utils/ballpark_ne.py, without reloading the chromosomes
+    diversities = np.array([summary["diversity"] for summary in summaries])
+    df = pd.DataFrame({'Ne': diversities / 4 / MUTATION_RATE, 'File': outfiles})
+    df.to_csv(ballpark_file, index=False)
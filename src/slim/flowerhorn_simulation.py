@@ -1,5 +1,6 @@
 import numpy as np
 import tskit, msprime
+import sys
 
 # Define constants of the model
 ANCIENT_NE1 = 15_000
@@ -0,0 +1,136 @@
+import numpy as np
+import tskit, pyslim, msprime
+import sys
+# mutation_overlay lives in src/utils, which the SLiM rules put on PYTHONPATH
+from mutation_overlay import record_overlay_seed
+from slimwrap import load_tree_sequence, scratch_files, split_chromosomes
+
+
+class PostProcessing:
+    """
+    Turn a SLiM tree sequence held in memory into the final chromosome: sample
+    individuals, simplify, recapitate and add neutral mutations in one chain,
+    then write the result and any requested summaries from the same object
+    instead of reloading the .trees file downstream.
+    """
+
+    def __init__(self, sample_size, ancestral_ne, recombination_rate, mutation_rate, store_mutations=True):
+        self.sample_size = sample_size
+        self.ancestral_ne = ancestral_ne
+        self.recombination_rate = recombination_rate
+        self.mutation_rate = mutation_rate
+        # Without stored mutations, readers add them with mutation_overlay.load
+        self.store_mutations = store_mutations
+
+    def sample(self, ts: tskit.TreeSequence, seed: int) -> tskit.TreeSequence:
+        """Keep the genomes of `sample_size` individuals alive at the end."""
+        rng = np.random.default_rng(seed=seed)
+        alive_inds = pyslim.individuals_alive_at(ts, 0)
+        keep_indivs = rng.choice(alive_inds, self.sample_size, replace=False)
+        # Nodes of the chosen individuals, in the order they were drawn
+        keep_nodes = ts.individuals_nodes[keep_indivs].ravel()
+        keep_nodes = keep_nodes[keep_nodes != tskit.NULL]
+        return ts.simplify(keep_nodes, keep_input_roots=True)
+
+    def recapitate(self, sts: tskit.TreeSequence, seed: int) -> tskit.TreeSequence:
+        return pyslim.recapitate(
+            sts,
+            ancestral_Ne=self.ancestral_ne,
+            recombination_rate=self.recombination_rate,
+            random_seed=seed,
+        )
+
+    def mutate(self, rts: tskit.TreeSequence) -> tskit.TreeSequence:
+        return msprime.sim_mutations(rts, rate=self.mutation_rate)
+
+    def run(
+        self,
+        ts: tskit.TreeSequence,
+        seed: int,
+        outfile: str,
+        sample: bool = True,
+    ) -> dict:
+        """
+        Process one chromosome and write it to `outfile`.
+
+        Parameters:
+        - ts (tskit.TreeSequence): SLiM output for the chromosome.
+        - seed (int): Seed for sampling and recapitation, also recorded as the
+          overlay seed when mutations are not stored.
+        - outfile (str): Where to dump the final tree sequence.
+        - sample (bool, optional): Whether individuals still have to be sampled,
+          False when `ts` was already reduced with `sample`.
+
+        Returns:
+        - dict: Summaries of the final tree sequence (nucleotide diversity and
+          number of segregating sites). Without stored mutations the diversity is
+          its expectation from branch lengths.
+        """
+        if sample:
+            ts = self.sample(ts, seed)
+        rts = self.recapitate(ts, seed)
+        if not self.store_mutations:
+            record_overlay_seed(rts, seed).dump(outfile)
+            diversity = rts.diversity(mode="branch") * self.mutation_rate
+            return {"diversity": float(diversity), "segregating_sites": 0}
+        mts = self.mutate(rts)
+        mts.dump(outfile)
+        return {"diversity": float(mts.diversity()), "segregating_sites": mts.num_sites}
+
+
+def simulate_single(model, pipeline, seeds, outfiles, constants, threads, max_memory) -> tuple:
+    """
+    Simulate each chromosome in its own SLiM process, up to `threads` at once
+    within `max_memory` MB, and post-process it with `pipeline`.
+
+    `constants` are those of the model for one chromosome, without NCHROM and
+    OUTFILE. Returns the seeds of the failed runs and the summaries of the
+    chromosomes written.
+    """
+    # SLiM outputs go to scratch (tmpfs when available). Each is loaded and
+    # removed as soon as its run finishes, so only the chromosomes still being
+    # simulated or post-processed occupy it.
+    failed = []
+    summaries = []
+    with scratch_files(len(outfiles)) as slim_outfiles:
+
+        def post_process(i, result):
+            if isinstance(result, Exception):
+                failed.append(seeds[i])
+                return
+            ts, load_time = load_tree_sequence(slim_outfiles[i])
+            print(f"Post-processing chromosome with seed {seeds[i]} (loaded in {load_time:.1f}s)")
+            summaries.append((i, pipeline.run(ts, seeds[i], outfiles[i])))
+
+        run_constants = [
+            {**constants, "NCHROM": 1, "OUTFILE": slim_outfile} for slim_outfile in slim_outfiles
+        ]
+        print(f"Simulating {len(outfiles)} chromosomes with up to {threads} SLiM processes")
+        model.run_many(
+            seeds, run_constants, max_workers=threads, max_memory=max_memory, callback=post_process
+        )
+    # Summaries in the order of `outfiles`, as written to the ballpark table
+    return failed, [summary for _, summary in sorted(summaries, key=lambda item: item[0])]
+
+
+def simulate_multi(model, pipeline, seeds, outfiles, constants) -> tuple:
+    """
+    Simulate all chromosomes in a single SLiM process, then split them apart.
+    The same individuals are sampled on every chromosome. Same arguments and
+    return value as `simulate_single`.
+    """
+    print(f"Simulating {len(outfiles)} chromosomes in a single SLiM process")
+    constants = {**constants, "NCHROM": len(outfiles)}
+    try:
+        result = model.run_tree_sequence(seeds[0], constants)
+    except Exception as e:
+        print(f"SLiM run with seed {seeds[0]} failed: {e!r}", file=sys.stderr)
+        return [seeds[0]], []
+    print(f"Loaded tree sequence in {result.load_time:.1f}s")
+    sts = pipeline.sample(result.ts, seeds[0])
+    chroms = split_chromosomes(sts, len(outfiles), constants["L"] + 1)
+    summaries = []
+    for outfile, seed, chrom in zip(outfiles, seeds, chroms):
+        print(f"Post-processing chromosome with seed {seed}")
+        summaries.append(pipeline.run(chrom, seed, outfile, sample=False))
+    return [], summaries
@@ -0,0 +1,21 @@
+# Constants and size trajectories of the invasion scenarios, shared by the
+# SLiM scripts and src/msprime/wright_fisher_simulation.py. Only numpy is
+# imported, so other engines can use them without slimwrap.
+import numpy as np
+
+SAMPLE_SIZE = 200
+ANCIENT_NE = 15_000
+CONTIG_LENGTH = 1e8
+RECOMBINATION_RATE = 1e-8
+MUTATION_RATE = 1e-8
+# Number of generations of the constant_recent_past model
+CONSTANT_RUNTIME = 100
+
+def ne_trajectory(Ne_modern: int, Ne_founder: int, runtime: int)-> np.ndarray:
+    # We aim to fit a exponential growth
+    # Ne(t) = Ne1 * exp(-\alpha * t)
+    # Ne_founder = Ne1 * exp(-\alpha * runtime)
+    # alpha = (log(Ne1) - log(Ne_founder)) / runtime
+    # alpha <- (log(Ne1) - log(Ne_founder)) / runtime
+    alpha = (np.log(Ne_modern) - np.log(Ne_founder)) / runtime
+    return np.flip(Ne_modern * np.exp(-alpha*np.arange(runtime))).astype(int)
@@ -2,8 +2,15 @@ from pathlib import Path
 import tempfile
 from typing import Any
 import numpy as np
+import tskit
 import subprocess
+import contextlib
+import functools
+import hashlib
 import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
 def check_slim_script(file: str) -> None:
@@ -18,73 +25,206 @@ def check_slim_script(file: str) -> None:
         raise ValueError(f"SLiM model check failed:\n{e.stderr.strip()}")
 
 
-def parse_ndarray(key: str, val: np.ndarray) -> str:
+@functools.lru_cache(maxsize=None)
+def slim_version() -> str:
+    result = subprocess.run(["slim", "-v"], text=True, capture_output=True, check=True)
+    return result.stdout.strip()
+
+
+# Hashes of (SLiM version, script) pairs that already passed `slim -c`
+_validated_scripts = set()
+
+
+def validation_cache_dir() -> Path:
+    default = Path.home() / ".cache" / "slimwrap"
+    return Path(os.environ.get("SLIMWRAP_CACHE_DIR", default))
+
+
+def check_slim_code(code: str, file: str) -> None:
+    """
+    Validate `file`, which contains `code`, unless the same script was already
+    validated with the same SLiM version, in this process or a previous one.
+    Only successful checks are cached.
+    """
+    key = hashlib.sha256(f"{slim_version()}\n{code}".encode("utf-8")).hexdigest()
+    if key in _validated_scripts:
+        return
+    marker = validation_cache_dir() / key
+    if not marker.exists():
+        check_slim_script(file)
+        try:
+            marker.parent.mkdir(parents=True, exist_ok=True)
+            marker.touch()
+        except OSError:
+            # The on-disk cache is best effort, e.g. on a read-only home
+            pass
+    _validated_scripts.add(key)
+
+
+def run_slim_process(commands: list, timeout: float = None):
+    """
+    Run a SLiM command and return its CompletedProcess together with its peak
+    resident memory in MB. Output goes to temporary files rather than pipes so
+    that we can reap the child with os.wait4 and read its resource usage.
+    """
+    with tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(commands, stdout=stdout, stderr=stderr)
+        start = time.monotonic()
+        while True:
+            pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+            if pid != 0:
+                break
+            if timeout is not None and time.monotonic() - start > timeout:
+                process.kill()
+                os.wait4(process.pid, 0)
+                process.returncode = -9
+                raise subprocess.TimeoutExpired(commands, timeout)
+            time.sleep(0.1)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        stdout.seek(0)
+        stderr.seek(0)
+        result = subprocess.CompletedProcess(
+            commands, process.returncode, stdout.read(), stderr.read()
+        )
+    # ru_maxrss is in kilobytes on Linux
+    return result, rusage.ru_maxrss / 1024
+
+
+def scratch_dir() -> str:
+    """
+    Fast location for intermediate SLiM outputs: SLIMWRAP_SCRATCH_DIR if set,
+    otherwise /dev/shm when writable (tmpfs), otherwise the default temp dir.
+    """
+    if "SLIMWRAP_SCRATCH_DIR" in os.environ:
+        return os.environ["SLIMWRAP_SCRATCH_DIR"]
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+@contextlib.contextmanager
+def scratch_files(n: int, suffix: str = ".trees"):
+    """Yield `n` paths in a fresh scratch directory that is removed on exit."""
+    directory = tempfile.mkdtemp(dir=scratch_dir())
+    try:
+        yield [os.path.join(directory, f"{i}{suffix}") for i in range(n)]
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def load_tree_sequence(path: str):
+    """Load a tree sequence fully into memory and remove the file."""
+    start = time.perf_counter()
+    ts = tskit.load(path)
+    load_time = time.perf_counter() - start
+    os.remove(path)
+    return ts, load_time
+
+
+def split_chromosomes(ts, nchrom: int, length: int):
+    """
+    Split a tree sequence simulated as `nchrom` concatenated chromosomes into
+    one trimmed tree sequence per chromosome.
+
+    Chromosome k is expected to span [k * (length + 1), k * (length + 1) + length),
+    followed by a single spacer base carrying a recombination rate of 0.5 that
+    unlinks it from the next chromosome. Input roots are kept so that every
+    chromosome can be recapitated on its own.
+    """
+    stride = length + 1
+    for k in range(nchrom):
+        start = k * stride
+        chrom = ts.keep_intervals([[start, start + length]], simplify=False).trim()
+        yield chrom.simplify(keep_input_roots=True)
+
+
+class TreeSequenceResult:
+    """Outcome of SLiMModel.run_tree_sequence."""
+
+    def __init__(self, ts, process, load_time):
+        self.ts = ts  # tskit.TreeSequence
+        self.process = process  # subprocess.CompletedProcess
+        self.load_time = load_time  # seconds spent in tskit.load
+
+
+# Arrays larger than this are passed through a side file rather than the command line
+INLINE_MAX_SIZE = 100
+
+AS_FUNCTIONS = {
+    "f": "asFloat",
+    "i": "asInteger",
+    "b": "asLogical",
+    "U": "asString",
+    "S": "asString",
+}
+
+
+def format_values(key: str, val: np.ndarray) -> np.ndarray:
     kind = val.dtype.kind
-    if kind == "f":
-        as_fn = "asFloat"
-        values = ",".join(map(str, val))
-    elif kind == "i":
-        as_fn = "asInteger"
-        values = ",".join(map(str, val))
-    elif kind == "b":
-        as_fn = "asLogical"
-        values = ",".join("T" if x else "F" for x in val)
-    elif kind in {"U", "S"}:
-        as_fn = "asString"
-        values = ",".join(f"'{x}'" for x in val)
-    else:
+    if kind not in AS_FUNCTIONS:
         raise ValueError(
             f"Unsupported array dtype for SLiM constant: key={key}, dtype={val.dtype}"
         )
-    return f"{key}={as_fn}(c({values}))"
+    # Vectorized conversion, float64 is formatted with its shortest round-trip repr
+    if kind == "b":
+        return np.where(val, "T", "F")
+    return val.astype(str)
 
 
-def parse_matrix(key: str, val: np.ndarray) -> str:
+def read_values(key: str, val: np.ndarray, directory: str) -> str:
+    """
+    Write the flattened values one per line to a file in `directory` and return
+    the Eidos expression that reads them back, so only the path goes through argv.
+    """
+    values = format_values(key, val)
+    if any("\n" in x for x in values):
+        raise ValueError(f"SLiM string constants cannot contain newlines: key={key}")
+    path = os.path.join(directory, f"{key}.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(values))
+    if val.dtype.kind == "b":
+        return f"(readFile('{path}') == 'T')"
+    return f"{AS_FUNCTIONS[val.dtype.kind]}(readFile('{path}'))"
+
+
+def inline_values(key: str, val: np.ndarray) -> str:
+    values = format_values(key, val)
+    if val.dtype.kind in {"U", "S"}:
+        values = np.char.add(np.char.add("'", values), "'")
+    return f"{AS_FUNCTIONS[val.dtype.kind]}(c({','.join(values)}))"
+
+
+def parse_ndarray(key: str, val: np.ndarray, directory: str = None) -> str:
+    if directory is not None and val.size > INLINE_MAX_SIZE:
+        return f"{key}={read_values(key, val, directory)}"
+    return f"{key}={inline_values(key, val)}"
+
+
+def parse_matrix(key: str, val: np.ndarray, directory: str = None) -> str:
     dims = val.shape
     val = val.reshape(-1)
-    kind = val.dtype.kind
-    if kind == "f":
-        as_fn = "asFloat"
-        values = ",".join(map(str, val))
-    elif kind == "i":
-        as_fn = "asInteger"
-        values = ",".join(map(str, val))
-    elif kind == "b":
-        as_fn = "asLogical"
-        values = ",".join("T" if x else "F" for x in val)
-    elif kind in {"U", "S"}:
-        as_fn = "asString"
-        values = ",".join(f"'{x}'" for x in val)
+    if directory is not None and val.size > INLINE_MAX_SIZE:
+        values = read_values(key, val, directory)
     else:
-        raise ValueError(
-            f"Unsupported array dtype for SLiM constant: key={key}, dtype={val.dtype}"
-        )
-    return (
-        f"{key}=matrix({as_fn}(c({values})), nrow={dims[0]}, ncol={dims[1]}, byrow=T)"
-    )
+        values = inline_values(key, val)
+    return f"{key}=matrix({values}, nrow={dims[0]}, ncol={dims[1]}, byrow=T)"
 
 
-def parse_key_value(key: str, val: Any) -> str:
+def parse_key_value(key: str, val: Any, directory: str = None) -> str:
     try:
         array = np.asarray(val)
-        if array.ndim == 0 and array.dtype.kind in {"i", "f", "b", "U", "S"}:
+    except (ValueError, TypeError):
+        # e.g. ragged nested lists
+        array = None
+    # Errors of the parsers themselves (newlines in strings, writing side
+    # files) are not type errors and propagate as they are
+    if array is not None and array.size > 0 and array.dtype.kind in {"i", "f", "b", "U", "S"}:
+        if array.ndim == 0:
             return parse_ndarray(key, np.array([val]))
-        if (
-            array.ndim == 1
-            and array.size > 0
-            and array.dtype.kind in {"i", "f", "b", "U", "S"}
-        ):
-            return parse_ndarray(key, array)
-        if (
-            array.ndim == 2
-            and array.size > 0
-            and array.dtype.kind in {"i", "f", "b", "U", "S"}
-        ):
-            return parse_matrix(key, array)
-        if array.ndim > 2:
-            ValueError("Unsupported number of dimensions")
-    except Exception:
-        pass
+        if array.ndim == 1:
+            return parse_ndarray(key, array, directory)
+        if array.ndim == 2:
+            return parse_matrix(key, array, directory)
     raise ValueError(
         f"Unsupported type for SLiM constant: key={key}, value={val} (type={type(val)})"
     )
@@ -105,7 +245,8 @@ class SLiMModel:
         Raises:
         - TypeError: If both model_source and model_code are provided, or if neither is provided.
         - TypeError: If model_source is not a string or Path object.
-        - ValueError: If the SLiM model code fails validation.
+        - ValueError: If the SLiM model code fails validation. Successful
+          validations are cached by script hash and SLiM version, see check_slim_code.
         """
         if model_source is not None and model_code is not None:
             raise TypeError(
@@ -114,25 +255,24 @@ class SLiMModel:
         if model_source is None and model_code is None:
             raise TypeError("Either model_source or model_code must be provided")
 
+        if model_code is None:
+            if isinstance(model_source, str):
+                with open(model_source, "r", encoding="utf-8") as f:
+                    model_code = f.read()
+            elif isinstance(model_source, Path):
+                with model_source.open("r", encoding="utf-8") as f:
+                    model_code = f.read()
+            else:
+                raise TypeError("model_source must be a str or Path")
+
         self._temp_file = tempfile.NamedTemporaryFile(
             delete=False, mode="w", encoding="utf-8"
         )
         self._temp_filepath = self._temp_file.name
-
-        if model_code is not None:
-            self._temp_file.write(model_code)
-        elif isinstance(model_source, str):
-            with open(model_source, "r", encoding="utf-8") as f:
-                self._temp_file.write(f.read())
-        elif isinstance(model_source, Path):
-            with model_source.open("r", encoding="utf-8") as f:
-                self._temp_file.write(f.read())
-        else:
-            raise TypeError("model_source must be a str or Path")
-
+        self._temp_file.write(model_code)
         self._temp_file.flush()
         self._temp_file.close()
-        check_slim_script(self._temp_filepath)
+        check_slim_code(model_code, self._temp_filepath)
         self.last_result = None  # Store last run result
 
     def run(self, seed=None, constants=None, check=True):
@@ -148,7 +288,8 @@ class SLiMModel:
           a random seed will be generated.
         - constants (dict, optional): A dictionary of constants to pass to the SLiM
           model. Keys should be strings representing variable names, and values
-          should be compatible with SLiM's expected data types.
+          should be compatible with SLiM's expected data types. Arrays with more
+          than INLINE_MAX_SIZE elements are passed through a temporary file.
         - check (bool, optional): If True, raises an exception if the SLiM process
           exits with a non-zero status. Defaults to True.
 
@@ -166,7 +307,6 @@ class SLiMModel:
             constants = {}
         if not isinstance(constants, dict):
             raise TypeError("constants argument should be a dictionary")
-        commands = ["slim"]
         if seed is None:
             # TO-DO: Check what's the actual supported range of seed values
             self.last_seed = np.random.randint(1, 2**32, 1)[0]
@@ -175,20 +315,140 @@ class SLiMModel:
                 self.last_seed = int(seed)
             except:
                 raise ValueError("seed should be and integer")
-        commands.extend(["-s", f"{self.last_seed}"])
-        for key, value in constants.items():
-            commands.extend(["-d", parse_key_value(key, value)])
-        commands.append(self._temp_filepath)
         self._last_seed = seed
-        try:
-            self.last_result = subprocess.run(
-                commands, capture_output=True, shell=False, check=check
-            )
-        except subprocess.CalledProcessError as e:
-            print(f"Error occurred while running SLiM:\n{e.stderr.decode().strip()}")
-            raise
+        # Large arrays are written here and read back by SLiM, see read_values
+        with tempfile.TemporaryDirectory() as constants_dir:
+            commands = self._commands(self.last_seed, constants, constants_dir)
+            try:
+                self.last_result = subprocess.run(
+                    commands, capture_output=True, shell=False, check=check
+                )
+            except subprocess.CalledProcessError as e:
+                print(f"Error occurred while running SLiM:\n{e.stderr.decode().strip()}")
+                raise
         return self.last_result
 
+    def run_tree_sequence(self, seed=None, constants=None, outfile_key="OUTFILE"):
+        """
+        Execute the SLiM model and return its tree sequence in memory.
+
+        The model is expected to write its tree sequence to the path given by the
+        `outfile_key` constant, which is set here to a file in scratch_dir(). The
+        file is removed as soon as it has been loaded, also when SLiM fails.
+
+        Parameters:
+        - seed (int, optional): As in `run`.
+        - constants (dict, optional): As in `run`, without the output path.
+        - outfile_key (str, optional): Name of the output path constant.
+
+        Returns:
+        - TreeSequenceResult: The tree sequence, the SLiM process result and the
+          time it took to load the tree sequence.
+        """
+        constants = dict(constants or {})
+        with scratch_files(1) as (outfile,):
+            constants[outfile_key] = outfile
+            process = self.run(seed=seed, constants=constants)
+            ts, load_time = load_tree_sequence(outfile)
+        return TreeSequenceResult(ts, process, load_time)
+
+    def run_many(
+        self,
+        seeds,
+        constants=None,
+        max_workers=None,
+        max_memory=None,
+        timeout=None,
+        callback=None,
+    ):
+        """
+        Execute the SLiM model once per seed, running up to `max_workers` SLiM
+        processes concurrently.
+
+        Parameters:
+        - seeds (list of int): One seed per run.
+        - constants (dict or list of dict, optional): Constants shared by all runs,
+          or one dictionary per seed (e.g. with a different OUTFILE per run).
+        - max_workers (int, optional): Maximum number of concurrent runs. Defaults
+          to the number of CPUs available to this process.
+        - max_memory (float, optional): Memory budget in MB. Runs are executed
+          alone until one succeeds, and its peak memory reduces the concurrency
+          so that the remaining runs fit in the budget.
+        - timeout (float, optional): Per-run timeout in seconds.
+        - callback (callable, optional): Called as callback(i, result) in the
+          calling thread as soon as run i finishes, e.g. to consume its output
+          while the other runs go on.
+
+        Returns:
+        - list: Results in the same order as `seeds`. Each element is either a
+          subprocess.CompletedProcess or the exception of a failed run
+          (subprocess.CalledProcessError, subprocess.TimeoutExpired, ...), so that
+          one bad seed does not lose the rest of the batch.
+
+        Raises:
+        - TypeError: If constants is neither a dictionary nor a list of them.
+        - ValueError: If the number of constants does not match the number of seeds.
+        """
+        seeds = [int(seed) for seed in seeds]
+        if constants is None:
+            constants = {}
+        if isinstance(constants, dict):
+            constants = [constants] * len(seeds)
+        if not all(isinstance(c, dict) for c in constants):
+            raise TypeError("constants should be a dictionary or a list of them")
+        if len(constants) != len(seeds):
+            raise ValueError("constants and seeds should have the same length")
+        if max_workers is None:
+            max_workers = len(os.sched_getaffinity(0))
+
+        def task(i):
+            try:
+                with tempfile.TemporaryDirectory() as constants_dir:
+                    commands = self._commands(seeds[i], constants[i], constants_dir)
+                    result, peak_memory = run_slim_process(commands, timeout)
+            except Exception as e:
+                print(f"SLiM run with seed {seeds[i]} failed: {e}")
+                return e, 0
+            if result.returncode != 0:
+                print(
+                    f"SLiM run with seed {seeds[i]} failed:\n{result.stderr.decode().strip()}"
+                )
+                error = subprocess.CalledProcessError(
+                    result.returncode, commands, result.stdout, result.stderr
+                )
+                return error, peak_memory
+            return result, peak_memory
+
+        results = [None] * len(seeds)
+        pending = list(range(len(seeds)))
+        # A failed run says nothing about the memory of the others, so probe
+        # with the next seed until one succeeds
+        while max_memory is not None and pending:
+            probe = pending.pop(0)
+            results[probe], peak_memory = task(probe)
+            if callback is not None:
+                callback(probe, results[probe])
+            if not isinstance(results[probe], Exception):
+                max_workers = max(1, min(max_workers, int(max_memory // max(peak_memory, 1))))
+                print(f"Peak memory per run {peak_memory:.0f} MB, using {max_workers} workers")
+                break
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(task, i): i for i in pending}
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()[0]
+                if callback is not None:
+                    callback(i, results[i])
+        self.last_results = results
+        return results
+
+    def _commands(self, seed, constants, constants_dir):
+        commands = ["slim", "-s", f"{seed}"]
+        for key, value in constants.items():
+            commands.extend(["-d", parse_key_value(key, value, constants_dir)])
+        commands.append(self._temp_filepath)
+        return commands
+
     def _repr_html_(self):
         try:
             with open(self._temp_filepath, "r", encoding="utf-8") as f:
@@ -262,8 +522,18 @@ class SLiMModel:
     def returncode(self):
         return self.last_result.returncode if self.last_result else None
 
-    def __del__(self):
+    def close(self):
+        """Remove the temporary copy of the model script."""
         try:
             os.remove(self._temp_filepath)
         except Exception:
             pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        self.close()
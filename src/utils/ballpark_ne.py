@@ -2,14 +2,18 @@ import tskit
 import numpy as np
 import pandas as pd
 import sys
-def analyze(infile: str, recombination_rate: float):
+def analyze(infile: str, recombination_rate: float, mutation_rate: float):
     ts = tskit.load(infile)
+    if ts.num_sites == 0:
+        # Stored without mutations: expected diversity from branch lengths
+        return ts.diversity(mode="branch") * mutation_rate
     return ts.diversity()
 
 def main(infiles, recombination_rate, mutation_rate):
     # Get a ballpark estimate of Ne in windows and concatenate
     diversities = np.array([
-        analyze(infile, recombination_rate=recombination_rate) for infile in infiles
+        analyze(infile, recombination_rate=recombination_rate, mutation_rate=mutation_rate)
+        for infile in infiles
     ])
     ne = diversities / 4 / mutation_rate
     df = pd.DataFrame({'Ne': ne, 'File': infiles})
@@ -0,0 +1,205 @@
+# Python bindings of the ld_binning library (external/ld_binning_src/src/ffi.rs)
+# over NumPy arrays and tree sequences, so binned LD can be computed in
+# process without writing a VCF/BCF. The statistic, bins and stopping rule
+# are those of the Rust code; this module only converts arrays.
+# `make external/ld_binning` builds the library with the CLI; set
+# LD_BINNING_LIB to load another build.
+import ctypes
+import os
+from pathlib import Path
+import numpy as np
+
+# Sites decoded at once when reading genotypes from a tree sequence
+CHUNK_SIZE = 10_000
+
+LIBRARY = os.environ.get(
+    "LD_BINNING_LIB", str(Path(__file__).resolve().parents[2] / "external" / "libld_binning.so")
+)
+
+
+def _array(dtype, ndim=1, writeable=False):
+    flags = ["C_CONTIGUOUS", "WRITEABLE"] if writeable else ["C_CONTIGUOUS"]
+    return np.ctypeslib.ndpointer(dtype=dtype, ndim=ndim, flags=flags)
+
+
+def _load(path: str):
+    lib = ctypes.CDLL(path)
+    size, f64, u64 = ctypes.c_size_t, ctypes.c_double, ctypes.c_uint64
+    lib.ld_binning_last_error.restype = ctypes.c_char_p
+    lib.ld_binning_last_error.argtypes = []
+    lib.ld_binning_bins.restype = size
+    lib.ld_binning_bins.argtypes = [f64, ctypes.c_void_p, ctypes.c_void_p]
+    lib.ld_binning_bin_index.restype = None
+    lib.ld_binning_bin_index.argtypes = [f64, _array(np.float64), size, _array(np.int64, 1, True)]
+    lib.ld_binning_standardize.restype = ctypes.c_int32
+    lib.ld_binning_standardize.argtypes = [
+        _array(np.float64, 2, True), size, size, f64, _array(np.uint8, 1, True)
+    ]
+    lib.ld_binning_linkage_disequilibrium.restype = ctypes.c_int32
+    lib.ld_binning_linkage_disequilibrium.argtypes = [
+        _array(np.float64), _array(np.float64, 2), size, size, _array(np.float64, 1, True)
+    ]
+    lib.ld_binning_converged.restype = ctypes.c_bool
+    lib.ld_binning_converged.argtypes = [
+        _array(np.uint32),
+        _array(np.float64),
+        _array(np.float64),
+        size,
+        size,
+        f64,
+        _array(np.uint8, 1, True),
+    ]
+    lib.ld_binning_scan.restype = ctypes.c_int32
+    # positions, dosages, n_sites, n_samples, contig_length, recombination_rate,
+    # maf_threshold, min_loci, epsilon, seed, max_draws, then the outputs
+    lib.ld_binning_scan.argtypes = [_array(np.uint64), _array(np.uint8, 2), size, size, u64]
+    lib.ld_binning_scan.argtypes += [f64, f64, size, f64, u64, u64]
+    lib.ld_binning_scan.argtypes += [
+        _array(np.uint32, 1, True),
+        _array(np.float64, 1, True),
+        _array(np.float64, 1, True),
+    ]
+    return lib
+
+
+_lib = _load(LIBRARY)
+
+
+def bins(recombination_rate: float = 1.0e-8):
+    # Left and right edges of the bins in Morgans
+    nbins = _lib.ld_binning_bins(recombination_rate, None, None)
+    left, right = np.zeros(nbins), np.zeros(nbins)
+    _lib.ld_binning_bins(recombination_rate, left.ctypes.data, right.ctypes.data)
+    return left, right
+
+
+def bin_index(distances, recombination_rate: float = 1.0e-8) -> np.ndarray:
+    # Bin of each distance in bp, -1 outside of the bins
+    distances = np.ascontiguousarray(distances, dtype=np.float64)
+    index = np.zeros(len(distances), dtype=np.int64)
+    _lib.ld_binning_bin_index(recombination_rate, distances, len(distances), index)
+    return index
+
+
+def standardize(dosages, maf_threshold: float = 0.25):
+    """
+    Standardize dosages (sites x individuals) as ld_binning does.
+
+    Returns the standardized genotypes, with the rows of sites below the MAF
+    threshold left as dosages, and a mask of the sites passing it.
+    """
+    genotypes = np.array(dosages, dtype=np.float64, order="C", ndmin=2)
+    n_sites, n_samples = genotypes.shape
+    passing = np.zeros(n_sites, dtype=np.uint8)
+    if _lib.ld_binning_standardize(genotypes, n_sites, n_samples, maf_threshold, passing) < 0:
+        raise ValueError(_lib.ld_binning_last_error().decode())
+    return genotypes, passing.astype(bool)
+
+
+def linkage_disequilibrium(focal, others) -> np.ndarray:
+    # LD statistic between standardized focal genotypes and each row of `others`
+    focal = np.ascontiguousarray(focal, dtype=np.float64)
+    others = np.array(others, dtype=np.float64, order="C", ndmin=2)
+    if others.shape[1] != len(focal):
+        raise ValueError(f"{others.shape[1]} samples in others, {len(focal)} in focal")
+    ld = np.zeros(len(others))
+    if _lib.ld_binning_linkage_disequilibrium(focal, others, len(others), len(focal), ld) < 0:
+        raise ValueError(_lib.ld_binning_last_error().decode())
+    return ld
+
+
+def converged(N, mean, M2, min_loci: int = 2000, epsilon: float = 0.0001):
+    """
+    Stopping rule over the per-bin count N, mean and M2 (N times the
+    population variance). Returns whether each bin has converged and
+    whether all of them have.
+    """
+    N = np.ascontiguousarray(N, dtype=np.uint32)
+    mean = np.ascontiguousarray(mean, dtype=np.float64)
+    M2 = np.ascontiguousarray(M2, dtype=np.float64)
+    done = np.zeros(len(N), dtype=np.uint8)
+    stop = _lib.ld_binning_converged(N, mean, M2, len(N), min_loci, epsilon, done)
+    return done.astype(bool), bool(stop)
+
+
+def binned_ld(
+    positions,
+    dosages,
+    contig_length: int,
+    recombination_rate: float = 1.0e-8,
+    maf_threshold: float = 0.25,
+    min_loci: int = 2000,
+    epsilon: float = 0.0001,
+    seed: int = 1234,
+    max_draws: int = 0,
+) -> dict:
+    """
+    Binned LD of one contig from sorted 0-based positions and dosages (sites x
+    individuals, sums of allele indices), with the focal SNP sampling of
+    ld_binning for contig 0 and the same seed.
+
+    Returns the columns of the ld_binning table as arrays (bin_index,
+    left_bin, right_bin, N, mean, var) plus M2 and `converged`, which is
+    False when `max_draws` focal positions (0 for no limit) were drawn
+    before the stopping rule was met.
+    """
+    positions = np.ascontiguousarray(positions, dtype=np.uint64)
+    dosages = np.array(dosages, dtype=np.uint8, order="C", ndmin=2)
+    if dosages.shape[0] != len(positions):
+        raise ValueError(f"{dosages.shape[0]} rows of dosages for {len(positions)} positions")
+    left, right = bins(recombination_rate)
+    N = np.zeros(len(left), dtype=np.uint32)
+    mean, M2 = np.zeros(len(left)), np.zeros(len(left))
+    n_sites, n_samples = dosages.shape
+    parameters = (recombination_rate, maf_threshold, min_loci, epsilon, seed, max_draws)
+    status = _lib.ld_binning_scan(
+        positions, dosages, n_sites, n_samples, contig_length, *parameters, N, mean, M2
+    )
+    if status < 0:
+        raise ValueError(_lib.ld_binning_last_error().decode())
+    with np.errstate(divide="ignore", invalid="ignore"):
+        var = M2 / N
+    return {
+        "bin_index": np.arange(len(left)),
+        "left_bin": left,
+        "right_bin": right,
+        "N": N.astype(np.int64),
+        "mean": mean,
+        "var": var,
+        "M2": M2,
+        "converged": status == 0,
+    }
+
+
+def tree_dosages(ts, pairs: np.ndarray, chunk_size: int = CHUNK_SIZE):
+    """
+    Positions and diploid dosages of the sites of a tree sequence, as
+    ld_binning reads the VCF written by tskit: sites at position 0 are dropped
+    (as by bcftools view -e 'POS=0') and the others get their 0-based BCF
+    position. `pairs` holds the two haplotype columns of each individual, see
+    tree_ld_binning.diploid_nodes. Genotypes are decoded `chunk_size` sites at
+    a time and summed per individual over the whole chunk.
+    """
+    site_positions = ts.sites_position.astype(np.int64)
+    kept = np.flatnonzero(site_positions > 0)
+    dosages = np.zeros((len(kept), len(pairs)), dtype=np.uint8)
+    genotypes = np.zeros((chunk_size, ts.num_samples), dtype=np.int32)
+    for start in range(0, len(kept), chunk_size):
+        sites = kept[start : start + chunk_size]
+        left = ts.sites_position[sites[0]]
+        right = ts.sites_position[sites[-1]]
+        variants = ts.variants(left=left, right=np.nextafter(right, np.inf), copy=False)
+        for k, variant in enumerate(variants):
+            genotypes[k] = variant.genotypes
+        chunk = genotypes[: len(sites)]
+        if np.any(chunk < 0):
+            site = sites[np.flatnonzero(np.any(chunk < 0, axis=1))[0]]
+            raise ValueError(f"Missing genotype at site {site}")
+        dosages[start : start + len(sites)] = chunk[:, pairs[:, 0]] + chunk[:, pairs[:, 1]]
+    return (site_positions[kept] - 1).astype(np.uint64), dosages
+
+
+def binned_ld_trees(ts, pairs: np.ndarray, contig_length: int, **options) -> dict:
+    # binned_ld over the sites of a tree sequence
+    positions, dosages = tree_dosages(ts, pairs)
+    return binned_ld(positions, dosages, contig_length, **options)
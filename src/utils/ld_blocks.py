@@ -0,0 +1,149 @@
+# Block bootstrap and jackknife replicates of the binned LD table from the
+# block-resolved statistics written by `ld_binning --blocks`. Replicates pool
+# the (N, mean, M2) of the chosen blocks exactly, so no LD is recomputed and
+# the resampling unit is a few Mb instead of a whole chromosome.
+import numpy as np
+import pandas as pd
+import sys
+from ld_table import format_float
+
+MAGIC = b"LDBLOCK1"
+
+
+def read_blocks(path: str):
+    """
+    Read a blocks file of ld_binning.
+
+    Returns the block size in bp, the bins (bin_index, left_bin, right_bin, in
+    Morgans) and one row per non-empty (contig, block, bin) cell with its
+    count N, mean and M2.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:8] != MAGIC:
+        raise ValueError(f"{path} is not an ld_binning blocks file")
+    block_size = int(np.frombuffer(data, "<u8", 1, 8)[0])
+    nbins = int(np.frombuffer(data, "<u4", 1, 16)[0])
+    offset = 20
+    edges = np.frombuffer(data, "<f8", 2 * nbins, offset)
+    offset += 16 * nbins
+    nrows = int(np.frombuffer(data, "<u8", 1, offset)[0])
+    offset += 8
+    columns = {}
+    for name in ["contig", "block", "bin_index", "N"]:
+        columns[name] = np.frombuffer(data, "<u4", nrows, offset).astype(np.int64)
+        offset += 4 * nrows
+    for name in ["mean", "M2"]:
+        columns[name] = np.frombuffer(data, "<f8", nrows, offset)
+        offset += 8 * nrows
+    bins = pd.DataFrame(
+        {"bin_index": np.arange(nbins), "left_bin": edges[:nbins], "right_bin": edges[nbins:]}
+    )
+    return block_size, bins, pd.DataFrame(columns)
+
+
+def read_chromosomes(paths: list):
+    # Cells of several files (e.g. one per chromosome) keyed by a running
+    # chromosome index, in file then contig order
+    cells = []
+    chromosome = 0
+    for path in paths:
+        _, bins, df = read_blocks(path)
+        for contig in np.unique(df["contig"]):
+            cells.append(df[df["contig"] == contig].assign(chromosome=chromosome))
+            chromosome += 1
+    return bins, pd.concat(cells, ignore_index=True)
+
+
+def pooled_table(cells: pd.DataFrame, bins: pd.DataFrame) -> pd.DataFrame:
+    """
+    Pool the cells of each chromosome and bin, each cell counted `weight`
+    times, into the ld_binning table layout (var is M2 / N). Every bin of
+    every chromosome gets a row; bins without cells have N 0 and NaN mean
+    and var.
+    """
+    chromosomes = np.unique(cells["chromosome"])
+    cells = cells[cells["weight"] > 0].copy()
+    cells["wN"] = cells["weight"] * cells["N"]
+    cells["wNmean"] = cells["wN"] * cells["mean"]
+    keys = ["chromosome", "bin_index"]
+    grouped = cells.groupby(keys)
+    N = grouped["wN"].sum()
+    mean = grouped["wNmean"].sum() / N
+    # Within-cell M2 plus the spread of the cell means around the pooled mean
+    cells = cells.join(mean.rename("pooled"), on=keys)
+    cells["M2_total"] = cells["weight"] * cells["M2"] + cells["wN"] * (
+        cells["mean"] - cells["pooled"]
+    ) ** 2
+    M2 = cells.groupby(keys)["M2_total"].sum()
+    table = pd.DataFrame({"N": N, "mean": mean, "var": M2 / N})
+    grid = pd.MultiIndex.from_product([chromosomes, bins["bin_index"]], names=keys)
+    table = table.reindex(grid).reset_index()
+    table["N"] = table["N"].fillna(0).astype(np.int64)
+    return table.merge(bins, on="bin_index")[
+        ["chromosome", "bin_index", "left_bin", "right_bin", "N", "mean", "var"]
+    ].sort_values(keys)
+
+
+def block_keys(cells: pd.DataFrame) -> pd.DataFrame:
+    return cells[["chromosome", "block"]].drop_duplicates().sort_values(["chromosome", "block"])
+
+
+def bootstrap_cells(cells: pd.DataFrame, rng: np.random.Generator) -> pd.DataFrame:
+    # Draw the blocks of each chromosome with replacement, as many as it has
+    weights = []
+    for chromosome, keys in block_keys(cells).groupby("chromosome"):
+        drawn = rng.choice(keys["block"].values, len(keys))
+        blocks, counts = np.unique(drawn, return_counts=True)
+        weights.append(pd.DataFrame({"chromosome": chromosome, "block": blocks, "weight": counts}))
+    weights = pd.concat(weights)
+    cells = cells.merge(weights, on=["chromosome", "block"], how="left")
+    cells["weight"] = cells["weight"].fillna(0).astype(np.int64)
+    return cells
+
+
+def jackknife_cells(cells: pd.DataFrame, index: int) -> pd.DataFrame:
+    # Leave out the index-th block, in chromosome then position order
+    keys = block_keys(cells)
+    if not 0 <= index < len(keys):
+        raise IndexError(f"Block {index} out of range, there are {len(keys)} blocks")
+    chromosome, block = keys.iloc[index]
+    left_out = (cells["chromosome"] == chromosome) & (cells["block"] == block)
+    return cells.assign(weight=np.where(left_out, 0, 1))
+
+
+def print_table(table: pd.DataFrame) -> None:
+    # Same text layout as ld_binning, one header per chromosome
+    for _, chromosome in table.groupby("chromosome"):
+        print("#bin_index\tleft_bin\tright_bin\tN\tmean\tvar")
+        for row in chromosome.itertuples():
+            values = [row.left_bin, row.right_bin]
+            text = [str(row.bin_index)] + [format_float(x) for x in values]
+            text += [str(row.N), format_float(row.mean), format_float(row.var)]
+            print("\t".join(text))
+
+
+if __name__ == "__main__":
+    usage = (
+        "Usage: python ld_blocks.py bootstrap <seed> <boot> <blocks_files...> > <OUTPUT_FILE>\n"
+        "       python ld_blocks.py jackknife <block> <blocks_files...> > <OUTPUT_FILE>\n"
+        "       python ld_blocks.py count <blocks_files...>"
+    )
+    if len(sys.argv) < 3:
+        print(usage)
+        sys.exit(1)
+    command = sys.argv[1]
+    if command == "bootstrap" and len(sys.argv) >= 5:
+        seed, boot = int(sys.argv[2]), int(sys.argv[3])
+        bins, cells = read_chromosomes(sys.argv[4:])
+        rng = np.random.default_rng(seed + boot)
+        print_table(pooled_table(bootstrap_cells(cells, rng), bins))
+    elif command == "jackknife" and len(sys.argv) >= 4:
+        bins, cells = read_chromosomes(sys.argv[3:])
+        print_table(pooled_table(jackknife_cells(cells, int(sys.argv[2])), bins))
+    elif command == "count":
+        _, cells = read_chromosomes(sys.argv[2:])
+        print(len(block_keys(cells)))
+    else:
+        print(usage)
+        sys.exit(1)
@@ -0,0 +1,24 @@
+# Text layout of the ld_binning output table, shared by the Python tools that
+# write or pool binned LD. Kept apart from ld_binning_core so that formatting
+# a table does not load the ld_binning library.
+import sys
+import numpy as np
+
+
+def format_float(x: float) -> str:
+    # Shortest round-trip decimal without exponent, as Rust's Display for f64
+    if np.isnan(x):
+        return "NaN"
+    if np.isinf(x):
+        return "inf" if x > 0 else "-inf"
+    return np.format_float_positional(x, trim="-")
+
+
+def print_table(table: dict, file=sys.stdout) -> None:
+    # Table returned by ld_binning_core.binned_ld, in the text layout of ld_binning
+    print("#bin_index\tleft_bin\tright_bin\tN\tmean\tvar", file=file)
+    for i in range(len(table["bin_index"])):
+        values = [table[column][i] for column in ["left_bin", "right_bin"]]
+        text = [str(table["bin_index"][i])] + [format_float(x) for x in values]
+        text += [str(table["N"][i]), format_float(table["mean"][i]), format_float(table["var"][i])]
+        print("\t".join(text), file=file)
@@ -0,0 +1,61 @@
+# Deferred neutral mutations for tree sequences stored without them.
+# The simulation records a per-chromosome seed in the provenance table, so the
+# same mutations are produced every time a file is read at a given rate.
+import numpy as np
+import tskit, msprime
+import json
+import sys
+
+PROVENANCE_KEY = "deferred_mutations"
+
+
+def record_overlay_seed(ts: tskit.TreeSequence, seed: int) -> tskit.TreeSequence:
+    tables = ts.dump_tables()
+    tables.provenances.add_row(record=json.dumps({PROVENANCE_KEY: {"seed": int(seed)}}))
+    return tables.tree_sequence()
+
+
+def overlay_seed(ts: tskit.TreeSequence):
+    # Most recent seed recorded in the provenances, None if there is none
+    for provenance in reversed(list(ts.provenances())):
+        try:
+            record = json.loads(provenance.record)
+        except ValueError:
+            continue
+        if isinstance(record, dict) and PROVENANCE_KEY in record:
+            return record[PROVENANCE_KEY]["seed"]
+    return None
+
+
+def load(infile: str, mutation_rate: float = None) -> tskit.TreeSequence:
+    """
+    Load a tree sequence, adding neutral mutations at `mutation_rate` if it was
+    stored without them. Files that already carry mutations are returned as is.
+    """
+    ts = tskit.load(infile)
+    if mutation_rate is None or ts.num_sites > 0:
+        return ts
+    seed = overlay_seed(ts)
+    if seed is None:
+        raise ValueError(f"{infile} has no mutations and no recorded overlay seed")
+    return msprime.sim_mutations(ts, rate=mutation_rate, random_seed=seed)
+
+
+if __name__ == "__main__":
+    # Sites at position 0 are dropped unless --allow-position-zero keeps them at
+    # VCF position 0, for callers that filter them out themselves
+    allow_position_zero = "--allow-position-zero" in sys.argv[1:]
+    args = [arg for arg in sys.argv[1:] if arg != "--allow-position-zero"]
+    if len(args) != 3:
+        print(
+            "Usage: mutation_overlay.py [--allow-position-zero] <INFILE> <mutation_rate> <contig> > <OUTPUT_FILE>"
+        )
+        sys.exit(1)
+    infile = args[0]
+    mutation_rate = float(args[1])
+    contig_id = args[2]
+    ts = load(infile, mutation_rate)
+    if not allow_position_zero:
+        ts = ts.delete_sites(np.flatnonzero(ts.sites_position == 0))
+    # Same VCF as python -m tskit vcf [--allow-position-zero] --contig-id <contig>
+    ts.write_vcf(sys.stdout, contig_id=contig_id, allow_position_zero=allow_position_zero)
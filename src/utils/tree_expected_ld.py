@@ -0,0 +1,154 @@
+# Expected binned LD from the genealogies alone, for mutation-free .trees.
+# For a pair of positions, every pair of branches (one in each marginal tree)
+# would carry a segregating site with probability proportional to the product
+# of their lengths, and the genotypes it would produce are fixed by the
+# branches' descendants. Averaging the ld_binning statistic (MAF filter,
+# standardized diploid dosages, unbiased r^2) over all those branch pairs gives
+# its exact expectation over mutation placement, so only the sampling of
+# position pairs remains as noise. Output has the bins and mean of ld_binning,
+# but its counts and spread are over position pairs rather than SNP pairs, so
+# they get their own names: `pairs` is the number of position pairs sampled in
+# the bin (ld_binning's N counts SNP pairs) and `pair_var` the variance of the
+# expected r^2 across them (ld_binning's var is across SNP pairs, and includes
+# the mutational noise this script averages out).
+import numpy as np
+import argparse
+import tskit
+import ld_binning_core
+from ld_table import format_float
+from tree_ld_binning import diploid_nodes
+
+
+def branch_genotypes(tree, pairs: np.ndarray, column: np.ndarray, maf_threshold: float):
+    """
+    Standardized diploid genotypes of a mutation on every branch of `tree`
+    passing the MAF filter, and the branch lengths used as weights.
+    """
+    n_haplotypes = 2 * len(pairs)
+    nodes = tree.preorder()
+    nodes = nodes[tree.parent_array[nodes] != tskit.NULL]
+    freq = np.array([tree.num_samples(u) for u in nodes]) / n_haplotypes
+    nodes = nodes[np.minimum(freq, 1 - freq) >= maf_threshold]
+    if len(nodes) == 0:
+        return np.zeros((0, len(pairs))), np.zeros(0)
+    haplotypes = np.zeros((len(nodes), n_haplotypes))
+    for k, u in enumerate(nodes):
+        below = column[tree.preorder(u)]
+        haplotypes[k, below[below >= 0]] = 1
+    dosage = haplotypes[:, pairs[:, 0]] + haplotypes[:, pairs[:, 1]]
+    p = dosage.sum(axis=1, keepdims=True) / n_haplotypes
+    genotypes = (dosage - 2 * p) / np.sqrt(2 * p * (1 - p))
+    time = tree.tree_sequence.nodes_time
+    weights = time[tree.parent_array[nodes]] - time[nodes]
+    return genotypes, weights
+
+
+def expected_ld(genotypes1, weights1, genotypes2, weights2):
+    # Length-weighted sum of the unbiased r^2 over all branch pairs, and the
+    # total weight, i.e. the expected number of passing SNP pairs up to mu^2
+    s = genotypes1.shape[1]
+    ld = genotypes1 @ genotypes2.T
+    ld_square = (genotypes1**2) @ (genotypes2**2).T
+    r2 = (ld * ld - ld_square) / (s * (s - 1))
+    return weights1 @ r2 @ weights2, weights1.sum() * weights2.sum()
+
+
+def trees_at(ts, positions: np.ndarray, pairs, column, maf_threshold) -> list:
+    # Branch genotypes of the marginal trees at `positions`, in a single
+    # left-to-right pass as seeking each position separately is much slower
+    indexes = np.searchsorted(ts.breakpoints(as_array=True), positions, side="right") - 1
+    cache = {}
+    tree = tskit.Tree(ts)
+    tree.first()
+    for index in np.unique(indexes):
+        while tree.index < index:
+            tree.next()
+        cache[index] = branch_genotypes(tree, pairs, column, maf_threshold)
+    return [cache[index] for index in indexes]
+
+
+def main(args) -> None:
+    ts = tskit.load(args.infile)
+    # Bin edges in Morgans, and in bp for drawing the partner positions
+    left, right = ld_binning_core.bins(args.recombination_rate)
+    nbins = len(left)
+    left_bp = left / args.recombination_rate
+    right_bp = right / args.recombination_rate
+    pairs = diploid_nodes(ts)
+    # Haplotype column of each sample node
+    column = np.full(ts.num_nodes, -1)
+    column[ts.samples()] = np.arange(ts.num_samples)
+    rng = np.random.default_rng(args.seed)
+    numerators = [[] for _ in range(nbins)]
+    denominators = [[] for _ in range(nbins)]
+    while True:
+        # Focal positions with one partner per bin, uniform within the bin
+        x = rng.uniform(0, ts.sequence_length - right_bp[-1], args.batch_size)
+        distances = rng.uniform(left_bp, right_bp, (args.batch_size, nbins))
+        focal = trees_at(ts, x, pairs, column, args.maf_threshold)
+        partners = trees_at(
+            ts, (x[:, None] + distances).ravel(), pairs, column, args.maf_threshold
+        )
+        for j, (genotypes1, weights1) in enumerate(focal):
+            for i in range(nbins):
+                genotypes2, weights2 = partners[j * nbins + i]
+                if len(weights1) == 0 or len(weights2) == 0:
+                    continue
+                numerator, denominator = expected_ld(genotypes1, weights1, genotypes2, weights2)
+                numerators[i].append(numerator)
+                denominators[i].append(denominator)
+        if should_stop(numerators, denominators, args):
+            break
+
+    print("#bin_index\tleft_bin\tright_bin\tpairs\tmean\tpair_var")
+    for i in range(nbins):
+        num = np.array(numerators[i])
+        den = np.array(denominators[i])
+        # Ratio estimator, weighting position pairs by their expected SNP pairs
+        mean = num.sum() / den.sum()
+        pair_var = np.var(num / den)
+        print(
+            "\t".join(
+                [
+                    str(i),
+                    format_float(left[i]),
+                    format_float(right[i]),
+                    str(len(num)),
+                    format_float(mean),
+                    format_float(pair_var),
+                ]
+            )
+        )
+
+
+def should_stop(numerators, denominators, args) -> bool:
+    # Same criterion as ld_binning, with the delta-method standard error of
+    # the ratio estimator in place of the standard error of a mean
+    for num, den in zip(numerators, denominators):
+        n = len(num)
+        if n < args.min_pairs:
+            return False
+        num = np.array(num)
+        den = np.array(den)
+        mean = num.sum() / den.sum()
+        residuals = (num - mean * den) / den.mean()
+        se = np.sqrt(np.sum(residuals**2) / (n - 1) / n)
+        if 1.96 * se > args.epsilon:
+            return False
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Expected binned LD from the genealogies of a tree sequence"
+    )
+    parser.add_argument("infile", help="Tree sequence (.trees), mutations are ignored")
+    parser.add_argument("--recombination-rate", type=float, default=1.0e-8)
+    parser.add_argument("--maf-threshold", type=float, default=0.25)
+    parser.add_argument("--min-pairs", type=int, default=200)
+    parser.add_argument("--epsilon", type=float, default=0.0001)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument(
+        "--batch-size", type=int, default=100, help="Focal positions per pass over the trees"
+    )
+    main(parser.parse_args())
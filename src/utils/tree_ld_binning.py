@@ -0,0 +1,76 @@
+# Binned LD straight from a tree sequence, a drop-in replacement for
+# `tskit vcf | bcftools view -e 'POS=0' | external/ld_binning` that skips the
+# VCF/BCF round trip. The MAF filter, standardization, focal SNP sampling,
+# HapNe bins, stopping rule and output table are those of
+# external/ld_binning_src, called through ld_binning_core.
+import numpy as np
+import argparse
+import sys
+import ld_binning_core
+from ld_table import print_table
+from mutation_overlay import load
+
+
+def diploid_nodes(ts) -> np.ndarray:
+    # Haplotype columns of each VCF sample, as paired by tskit's write_vcf
+    samples = ts.samples()
+    individuals = ts.nodes_individual[samples]
+    if np.all(individuals != -1):
+        nodes = ts.individuals_nodes[np.unique(individuals)]
+        index = np.full(ts.num_nodes, -1)
+        index[samples] = np.arange(len(samples))
+        return index[nodes]
+    return np.arange(len(samples)).reshape(-1, 2)
+
+
+def main(args) -> None:
+    ts = load(args.infile, args.mutation_rate)
+    positions, dosages = ld_binning_core.tree_dosages(ts, diploid_nodes(ts))
+    if len(positions) == 0:
+        sys.exit(f"No sites in {args.infile}")
+    table = ld_binning_core.binned_ld(
+        positions,
+        dosages,
+        int(ts.sequence_length),
+        recombination_rate=args.recombination_rate,
+        maf_threshold=args.maf_threshold,
+        min_loci=args.min_loci,
+        epsilon=args.epsilon,
+        seed=args.seed,
+        max_draws=args.max_draws,
+    )
+    if not table["converged"]:
+        done, _ = ld_binning_core.converged(
+            table["N"], table["mean"], table["M2"], args.min_loci, args.epsilon
+        )
+        print(
+            f"Warning: {args.max_draws} focal positions drawn without reaching --min-loci "
+            f"{args.min_loci} and --epsilon {args.epsilon} in bins {np.flatnonzero(~done).tolist()}",
+            file=sys.stderr,
+        )
+    print_table(table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Binned LD from a tree sequence, same options as external/ld_binning"
+    )
+    parser.add_argument("infile", help="Tree sequence (.trees)")
+    parser.add_argument("--recombination-rate", type=float, default=1.0e-8)
+    parser.add_argument("--maf-threshold", type=float, default=0.25)
+    parser.add_argument("--min-loci", type=int, default=2000)
+    parser.add_argument("--epsilon", type=float, default=0.0001)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument(
+        "--max-draws",
+        type=int,
+        default=0,
+        help="Focal positions drawn before giving up on the stopping rule, 0 for no limit",
+    )
+    parser.add_argument(
+        "--mutation-rate",
+        type=float,
+        default=None,
+        help="Rate of the mutation overlay for trees stored without mutations",
+    )
+    main(parser.parse_args())
@@ -1,20 +1,31 @@
 # A plink-friendly script to write VCF files from tree-sequences.
+import numpy as np
 import tskit
 import sys
+from mutation_overlay import load
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: tskit_vcf_export.py <INFILE> <contig> > <OUTPUT_FILE>")
+    # Sites at position 0 are dropped, as the rules did with bcftools view -e 'POS=0',
+    # unless --allow-position-zero keeps them at VCF position 0
+    allow_position_zero = "--allow-position-zero" in sys.argv[1:]
+    args = [arg for arg in sys.argv[1:] if arg != "--allow-position-zero"]
+    if len(args) not in (2, 3):
+        print(
+            "Usage: tskit_vcf_export.py [--allow-position-zero] <INFILE> <contig> [mutation_rate] > <OUTPUT_FILE>"
+        )
         sys.exit(1)
-    infile = sys.argv[1]
-    contig_id = sys.argv[2]
-    ts = tskit.load(infile)
+    infile = args[0]
+    contig_id = args[1]
+    # Only used for files stored without mutations, see mutation_overlay.py
+    mutation_rate = float(args[2]) if len(args) == 3 else None
+    ts = load(infile, mutation_rate)
+    if not allow_position_zero:
+        ts = ts.delete_sites(np.flatnonzero(ts.sites_position == 0))
     n_dip_indv = int(ts.num_samples / 2)
     indv_names = [f"tsk_{i}indv" for i in range(n_dip_indv)]
-    with open("/dev/stdout", "w") as vcf_file:
-        ts.write_vcf(
-            vcf_file,
-            individual_names=indv_names,
-            contig_id=contig_id,
-            allow_position_zero=True,
-        )
+    ts.write_vcf(
+        sys.stdout,
+        individual_names=indv_names,
+        contig_id=contig_id,
+        allow_position_zero=allow_position_zero,
+    )
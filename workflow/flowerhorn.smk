@@ -13,7 +13,7 @@ rule plot_method_flowerhorn:
     input:
         bayesbagg=expand(
             "steps/inference/exponential_piecewise_model/flowerhorn/ne1_{{ne1}}_ne2_{{founders}}_t{{t0}}_n{{sample_size}}/s{{seed}}_b{boot}_advi.nc",
-            boot=range(50)
+            boot=range(NUM_BOOTSTRAPS)
         )
     localrule: True
     output:
@@ -42,16 +42,72 @@ rule flowerhorn_simulation:
             i=range(NUM_CHROMOSOMES),
         ),
     resources:
+        mem_mb=16000,
         runtime="12h",
+    # Chromosomes are simulated in parallel within the memory budget
     threads: 4
     conda:
         "../external/conda_env.yaml"
     log:
         "logs/trees/flowerhorn/ne1_{ne1}_ne2_{ne2}_t{t_inv}_n{sample_size}/s{seed}.log",
+    benchmark:
+        "steps/benchmarks/trees/flowerhorn/ne1_{ne1}_ne2_{ne2}_t{t_inv}_n{sample_size}/s{seed}.tsv"
+    params:
+        # See ANCESTRY_MODELS in the script
+        ancestry="hudson",
+    shell:
+        """
+        source {COMMON}
+        python {input} {wildcards.seed} {wildcards.ne1} {wildcards.ne2} {wildcards.t_inv} {wildcards.sample_size} \
+            {threads} {resources.mem_mb} {params.ancestry} {output} > {log} 2>&1
+        """
+
+# Same scenario under an approximate ancestry model, written to flowerhorn_{ancestry}
+use rule flowerhorn_simulation as flowerhorn_simulation_ancestry with:
+    output:
+        expand(
+            "steps/trees/flowerhorn_{{ancestry}}/ne1_{{ne1}}_ne2_{{ne2}}_t{{t_inv}}_n{{sample_size}}/s{{seed}}_chr{i}.trees",
+            i=range(NUM_CHROMOSOMES),
+        ),
+    wildcard_constraints:
+        ancestry="smc|smc_prime|dtwf",
+    log:
+        "logs/trees/flowerhorn_{ancestry}/ne1_{ne1}_ne2_{ne2}_t{t_inv}_n{sample_size}/s{seed}.log",
+    benchmark:
+        "steps/benchmarks/trees/flowerhorn_{ancestry}/ne1_{ne1}_ne2_{ne2}_t{t_inv}_n{sample_size}/s{seed}.tsv"
+    params:
+        ancestry=lambda wildcards: wildcards.ancestry,
+
+# Runtime, memory and binned LD of every ancestry model relative to Hudson
+rule ancestry_model_benchmark:
+    input:
+        script="src/msprime/ancestry_model_benchmark.py",
+        ld=[
+            f"steps/binned_ld/{prefix}/{{params}}/s{seed}.csv"
+            for prefix in ["flowerhorn", "flowerhorn_smc", "flowerhorn_smc_prime", "flowerhorn_dtwf"]
+            for seed in range(100, 105)
+        ],
+        benchmarks=[
+            f"steps/benchmarks/trees/{prefix}/{{params}}/s{seed}.tsv"
+            for prefix in ["flowerhorn", "flowerhorn_smc", "flowerhorn_smc_prime", "flowerhorn_dtwf"]
+            for seed in range(100, 105)
+        ],
+    output:
+        bins="steps/benchmarks/ancestry_models/flowerhorn/{params}_bins.csv",
+        summary="steps/benchmarks/ancestry_models/flowerhorn/{params}_summary.csv",
+    wildcard_constraints:
+        params="[^/]+",
+    localrule: True
+    conda:
+        "../external/conda_env.yaml"
+    params:
+        replicates=5,
+        models="hudson,smc,smc_prime,dtwf",
     shell:
         """
         source {COMMON}
-        python {input} {wildcards.seed} {wildcards.ne1} {wildcards.ne2} {wildcards.t_inv} {wildcards.sample_size} {output} 2> {log}
+        python {input.script} {output.bins} {output.summary} \
+            {params.replicates} {params.models} {input.ld} {input.benchmarks}
         """
 
 rule fit_exponential_piecewise_model_boot_approx_flowerhorn:
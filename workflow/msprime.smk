@@ -0,0 +1,81 @@
+# msprime alternative to the SLiM simulations of the invasion scenarios:
+# discrete-time Wright-Fisher over the same size trajectory, then the Hudson
+# coalescent in place of recapitation. Outputs live under "{scenario}_msprime"
+# so every downstream rule applies unchanged
+rule sim_constant_recent_past_msprime:
+    input:
+        "src/msprime/wright_fisher_simulation.py",
+    output:
+        expand(
+            "steps/trees/constant_recent_past_msprime/n{{n}}/s{{seed}}_chr{i}.trees",
+            i=range(NUM_CHROMOSOMES),
+        ),
+    resources:
+        mem_mb=8000,
+        runtime="60min",
+    threads: 8
+    conda:
+        "../external/conda_env.yaml"
+    log:
+        "logs/trees/constant_recent_past_msprime/n{n}/s{seed}.log",
+    benchmark:
+        "steps/benchmarks/trees/constant_recent_past_msprime/n{n}/s{seed}.tsv"
+    shell:
+        """
+        source {COMMON}
+        PYTHONPATH=src/slim:src/utils python {input} constant_recent_past {wildcards.seed} {wildcards.n} {threads} {MUTATIONS} {output} 2> {log}
+        """
+
+
+rule sim_exponential_growth_msprime:
+    input:
+        "src/msprime/wright_fisher_simulation.py",
+    output:
+        expand(
+            "steps/trees/exponential_growth_msprime/ne1_{{ne1}}_ne2_{{ne2}}_t{{t_inv}}/s{{seed}}_chr{i}.trees",
+            i=range(NUM_CHROMOSOMES),
+        ),
+    resources:
+        mem_mb=8000,
+        runtime="60min",
+    threads: 8
+    conda:
+        "../external/conda_env.yaml"
+    log:
+        "logs/trees/exponential_growth_msprime/ne1_{ne1}_ne2_{ne2}_t{t_inv}/s{seed}.log",
+    benchmark:
+        "steps/benchmarks/trees/exponential_growth_msprime/ne1_{ne1}_ne2_{ne2}_t{t_inv}/s{seed}.tsv"
+    shell:
+        """
+        source {COMMON}
+        PYTHONPATH=src/slim:src/utils python {input} exponential_growth {wildcards.seed} {wildcards.ne1} {wildcards.ne2} {wildcards.t_inv} {threads} {MUTATIONS} {output} 2> {log}
+        """
+
+
+# Binned LD and runtime of the msprime engine against SLiM on the same scenario,
+# e.g. steps/benchmarks/engines/exponential_growth/ne1_10000_ne2_100_t50_bins.csv
+rule engine_fidelity:
+    input:
+        script="src/msprime/engine_fidelity.py",
+        slim_ld=expand("steps/binned_ld/{{scenario}}/{{params}}/s{seed}.csv", seed=range(100, 106)),
+        msprime_ld=expand("steps/binned_ld/{{scenario}}_msprime/{{params}}/s{seed}.csv", seed=range(100, 106)),
+        slim_benchmarks=expand("steps/benchmarks/trees/{{scenario}}/{{params}}/s{seed}.tsv", seed=range(100, 106)),
+        msprime_benchmarks=expand("steps/benchmarks/trees/{{scenario}}_msprime/{{params}}/s{seed}.tsv", seed=range(100, 106)),
+    output:
+        bins="steps/benchmarks/engines/{scenario}/{params}_bins.csv",
+        runtime="steps/benchmarks/engines/{scenario}/{params}_runtime.csv",
+    wildcard_constraints:
+        scenario="constant_recent_past|exponential_growth",
+        params="[^/]+",
+    localrule: True
+    conda:
+        "../external/conda_env.yaml"
+    params:
+        replicates=6,
+    shell:
+        """
+        source {COMMON}
+        python {input.script} {output.bins} {output.runtime} {params.replicates} \
+            {input.slim_ld} {input.msprime_ld} \
+            {input.slim_benchmarks} {input.msprime_benchmarks}
+        """
@@ -0,0 +1,40 @@
+# Sequential Monte Carlo alternative to fit_exponential_piecewise_model_boot
+# Each core runs an independent tempered SMC population, which also yields
+# an estimate of the marginal likelihood for model comparison
+rule fit_exponential_piecewise_model_boot_smc:
+    input:
+        "src/pymc/exponential_piecewise_smc_boot.py",
+        "steps/binned_ld/{prefix}/s{seed}.csv",
+        "steps/inference/ballpark_ne/{prefix}/s{seed}.csv",
+    output:
+        "steps/inference/exponential_piecewise_model/{prefix}/s{seed}_b{boot}_smc.nc",
+    resources:
+        runtime="120min",
+    threads: 8
+    conda:
+        "../external/conda_env.yaml"
+    log:
+        "logs/inference/exponential_piecewise_model_bagging/{prefix}/s{seed}_b{boot}_smc.log",
+    params:
+        ne1_prior_sd=10_000,
+        t0_prior_mean=50,
+        t0_prior_sd=30,
+        alpha_logfold_prior_sd=1,
+        sample_size=200,
+        # Particles per core
+        draws=1000,
+        parameterization="truncated",
+        kernel="MH",
+    shell:
+        """
+        source {COMMON}
+        TMP_COMPILEDIR=$(mktemp -d)
+        export PYTENSOR_FLAGS="compiledir=${{TMP_COMPILEDIR}}"
+        python {input} \
+            {params.ne1_prior_sd} {params.t0_prior_mean} \
+            {params.t0_prior_sd} {params.alpha_logfold_prior_sd} \
+            {params.sample_size} {wildcards.seed} {wildcards.boot} \
+            {threads} {params.draws} {output} \
+            {params.parameterization} {params.kernel} 2>&1 > {log}
+        rm -rf "${{TMP_COMPILEDIR}}"
+        """